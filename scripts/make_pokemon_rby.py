@@ -1,12 +1,14 @@
 import os
 import subprocess
+import sys
 
 import click
 import yaml
 
+from bitsheets.cache import ProcessingCache
 from bitsheets.lilypond import dump_scores_lilypond
-from bitsheets.loader import get_scores_pokemon_rby
-from bitsheets.processing import apply_processing
+from bitsheets.loader import get_scores_pokemon_rby, iter_scores_pokemon_rby
+from bitsheets.processing import BACKENDS, apply_processing, compile_processing
 
 
 @click.command()
@@ -30,11 +32,47 @@ from bitsheets.processing import apply_processing
 )
 @click.option(
     "--track",
-    help="Which track to make",
+    help="Which track to make (can be given multiple times)",
     required=False,
-    default="route_01",
+    default=["route_01"],
+    multiple=True,
     type=str,
 )
+@click.option(
+    "--all_tracks",
+    help="Make all tracks in the sheets config",
+    is_flag=True,
+    default=False,
+    type=bool,
+)
+@click.option(
+    "--jobs",
+    help="Number of worker processes when making multiple tracks",
+    required=False,
+    default=None,
+    type=int,
+)
+@click.option(
+    "--cache_dir",
+    help="Directory of persistent score and processing cache",
+    required=False,
+    default=None,
+    type=click.Path(),
+)
+@click.option(
+    "--backend",
+    help="Processing backend",
+    required=False,
+    default="python",
+    type=click.Choice(BACKENDS),
+)
+@click.option(
+    "--check",
+    help="Verify declared properties of processing ops after every step",
+    is_flag=True,
+    default=False,
+    type=bool,
+)
 @click.option(
     "--midi/--no-midi",
     help="Whether to create MIDI output",
@@ -56,14 +94,87 @@ from bitsheets.processing import apply_processing
     default=".",
     type=click.Path(),
 )
-def main(rom_pth, ptrs_pth, track, config_pth, midi, lily, out_pth):  # noqa: D103
-    scores = get_scores_pokemon_rby(rom_pth, ptrs_pth, track)
-
+def main(
+    rom_pth,
+    ptrs_pth,
+    track,
+    all_tracks,
+    jobs,
+    config_pth,
+    cache_dir,
+    backend,
+    check,
+    midi,
+    lily,
+    out_pth,
+):  # noqa: D103
     with open(config_pth, "r") as f:
-        sheets_config = yaml.safe_load(f)[track]
+        sheets_configs = yaml.safe_load(f)
+
+    tracks = list(sheets_configs) if all_tracks else list(track)
+    # Validate processing configs before loading any scores
+    plans = {t: compile_processing(sheets_configs[t], backend) for t in tracks}
+    cache = None
+    if cache_dir is not None:
+        cache = ProcessingCache(os.path.join(cache_dir, "processing"))
+
+    if len(tracks) == 1:
+        scores = get_scores_pokemon_rby(
+            rom_pth, ptrs_pth, tracks[0], cache_dir=cache_dir
+        )
+        sys.exit(
+            make_track(
+                tracks[0],
+                scores,
+                sheets_configs[tracks[0]],
+                plans[tracks[0]],
+                cache,
+                check,
+                midi,
+                lily,
+                out_pth,
+            )
+        )
+
+    returncode = 0
+    for result in iter_scores_pokemon_rby(
+        rom_pth, ptrs_pth, tracks, processes=jobs, cache_dir=cache_dir
+    ):
+        if result.error is not None:
+            click.echo(f"{result.track}: failed\n{result.error}", err=True)
+            returncode = 1
+            continue
+        click.echo(f"{result.track}: parsed in {result.seconds:.3f}s")
+        returncode |= make_track(
+            result.track,
+            result.scores,
+            sheets_configs[result.track],
+            plans[result.track],
+            cache,
+            check,
+            midi,
+            lily,
+            out_pth,
+        )
+    sys.exit(returncode)
+
+
+def make_track(track, scores, sheets_config, plan, cache, check, midi, lily, out_pth):
+    """
+    Process scores of one track, dump them to LilyPond and return an exit code.
 
+    :param track: Track name
+    :param scores: Parsed scores, one per channel
+    :param sheets_config: Sheets config of the track
+    :param plan: Compiled processing plan
+    :param cache: Processing cache or None
+    :param check: Whether to verify declared op properties after every step
+    :param midi: Whether to create MIDI output
+    :param lily: Whether to run lilypond
+    :param out_pth: Output path
+    """
     # Preprocess scores
-    scores = apply_processing(scores, sheets_config)
+    scores = apply_processing(scores, plan, cache=cache, check=check)
 
     lily_pth = os.path.join(out_pth, track + ".lily")
 
@@ -83,6 +194,7 @@ def main(rom_pth, ptrs_pth, track, config_pth, midi, lily, out_pth):  # noqa: D1
         return subprocess.call(
             ["lilypond", "-o", os.path.join(out_pth, track), lily_pth]
         )
+    return 0
 
 
 if __name__ == "__main__":
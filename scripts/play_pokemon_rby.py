@@ -1,7 +1,8 @@
 import click
 
+from bitsheets.apu import GB_WAVEFORMS
 from bitsheets.loader import get_scores_pokemon_rby
-from bitsheets.player import Player
+from bitsheets.player import Mixer, Player
 
 
 @click.command()
@@ -31,14 +32,17 @@ from bitsheets.player import Player
     default=44100,
     type=int,
 )
-def main(rom_pth, ptrs_pth, track, fs):  # noqa: D103
+@click.option(
+    "--gb",
+    help="Synthesize pulse and wave channels like the Game Boy",
+    is_flag=True,
+)
+def main(rom_pth, ptrs_pth, track, fs, gb):  # noqa: D103
     scores = get_scores_pokemon_rby(rom_pth, ptrs_pth, track)
 
-    player = Player(fs)
-
-    waves = player.get_waves(scores)
+    player = Player(fs, waveform=GB_WAVEFORMS if gb else "sawtooth")
 
-    player.play_wave(sum(waves))
+    player.play_wave(Mixer(player).get_wave(scores))
     player.wait_done()
 
 
@@ -0,0 +1,94 @@
+import click
+
+from bitsheets.apu import GB_WAVEFORMS
+from bitsheets.output import iter_dump_tracks_wav
+
+
+@click.command()
+@click.option(
+    "--rom_pth",
+    help="Path to rom file",
+    required=True,
+    type=click.Path(),
+)
+@click.option(
+    "--ptrs_pth",
+    help="Path to pointers file",
+    required=True,
+    type=click.Path(),
+)
+@click.option(
+    "--track",
+    help="Which track to render (can be given multiple times), defaults to all",
+    required=False,
+    default=None,
+    multiple=True,
+    type=str,
+)
+@click.option(
+    "--jobs",
+    help="Number of worker processes",
+    required=False,
+    default=None,
+    type=int,
+)
+@click.option(
+    "--cache_dir",
+    help="Directory of persistent score cache",
+    required=False,
+    default=None,
+    type=click.Path(),
+)
+@click.option(
+    "--fs",
+    help="Sampling rate",
+    required=False,
+    default=44100,
+    type=int,
+)
+@click.option(
+    "--gb",
+    help="Synthesize pulse and wave channels like the Game Boy",
+    is_flag=True,
+)
+@click.option(
+    "--mmap",
+    "use_mmap",
+    help="Write WAV files through memory maps",
+    is_flag=True,
+)
+@click.option(
+    "--out_pth",
+    help="Output directory",
+    required=False,
+    default=".",
+    type=click.Path(),
+)
+def main(
+    rom_pth, ptrs_pth, track, jobs, cache_dir, fs, gb, use_mmap, out_pth
+):  # noqa: D103
+    returncode = 0
+    for result in iter_dump_tracks_wav(
+        rom_pth,
+        ptrs_pth,
+        out_pth,
+        tracks=list(track) or None,
+        processes=jobs,
+        cache_dir=cache_dir,
+        fs=fs,
+        waveform=GB_WAVEFORMS if gb else "sawtooth",
+        use_mmap=use_mmap,
+    ):
+        if result.error is not None:
+            click.echo(f"{result.track}: failed\n{result.error}", err=True)
+            returncode = 1
+            continue
+        click.echo(
+            f"{result.track}: {result.n_samples / fs:.1f}s of audio rendered in "
+            f"{result.seconds:.3f}s"
+        )
+    return returncode
+
+
+if __name__ == "__main__":
+    main()
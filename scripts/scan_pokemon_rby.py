@@ -0,0 +1,42 @@
+import click
+import yaml
+
+from bitsheets.scanner import dump_pointer_config, scan_pointer_config
+
+
+@click.command()
+@click.option(
+    "--rom_pth",
+    help="Path to rom file",
+    required=True,
+    type=click.Path(),
+)
+@click.option(
+    "--ptrs_pth",
+    help="Path to existing pointers file to take track names and titles from",
+    required=False,
+    default=None,
+    type=click.Path(),
+)
+@click.option(
+    "--out_pth",
+    help="Output path of pointers file",
+    required=True,
+    type=click.Path(),
+)
+def main(rom_pth, ptrs_pth, out_pth):  # noqa: D103
+    music_ptrs = None
+    if ptrs_pth is not None:
+        with open(ptrs_pth, "r") as f:
+            music_ptrs = yaml.safe_load(f)
+
+    with open(rom_pth, "rb") as f:
+        rom = f.read()
+
+    config = scan_pointer_config(rom, music_ptrs)
+    dump_pointer_config(config, out_pth)
+    click.echo(f"Found {len(config)} music tracks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Number of samples per cycle of band-limited wavetables
+TABLE_SIZE = 2048
+
+# Output levels of the pulse channels over one cycle for every duty cycle
+PULSE_DUTIES = {
+    "pulse12": (0, 0, 0, 0, 0, 0, 0, 1),
+    "pulse25": (1, 0, 0, 0, 0, 0, 0, 1),
+    "pulse50": (1, 0, 0, 0, 0, 1, 1, 1),
+    "pulse75": (0, 1, 1, 1, 1, 1, 1, 0),
+}
+
+# 4-bit samples of the wave channel RAM, a triangle by default
+DEFAULT_WAVE_RAM = tuple(range(16)) + tuple(range(15, -1, -1))
+
+# Register width of the noise LFSR in long and short mode
+NOISE_WIDTHS = {"noise": 15, "noise7": 7}
+
+# LFSR clocks per cycle of a note played on the noise channel
+NOISE_STEPS = 2**7 - 1
+
+# Waveforms of the Game Boy channels
+APU_WAVEFORMS = tuple(PULSE_DUTIES) + ("wave",) + tuple(NOISE_WIDTHS)
+
+# Waveforms of pulse 1, pulse 2, wave and noise channel
+GB_WAVEFORMS = ["pulse50", "pulse25", "wave", "noise"]
+
+
+class Wavetable:
+    def __init__(self, tables: np.ndarray, rate: float = 1.0):
+        """
+        Precomputed wavetable indexed by a phase accumulator.
+
+        Every row holds one cycle of the waveform, band-limited for a range of
+        pitches: row b contains only harmonics that stay below the Nyquist frequency
+        for up to 2 ** b / size cycles per sample. A table with a single row is not
+        band-limited.
+
+        :param tables: Cycles of shape (n_bands, size)
+        :param rate: Table cycles per cycle of a note
+        """
+        self.tables = np.ascontiguousarray(tables, dtype=np.float32)
+        self.flat = self.tables.ravel()
+        self.rate = rate
+
+    @staticmethod
+    def from_cycle(cycle: Tuple[float, ...], size: int = TABLE_SIZE) -> "Wavetable":
+        """
+        Create band-limited wavetable from the levels of one cycle.
+
+        The DC component is removed, as on the high-pass filtered output of the
+        hardware, and all bands are scaled by the same factor to a peak of 1.
+
+        :param cycle: Levels of one cycle, their number must divide size
+        :param size: Number of samples per cycle
+        """
+        if size % len(cycle):
+            raise ValueError("Cycle length must divide table size")
+        spectrum = np.fft.rfft(
+            np.repeat(np.asarray(cycle, np.float64), size // len(cycle))
+        )
+        spectrum[0] = 0
+
+        n_bands = int(np.log2(size))
+        tables = np.empty((n_bands, size))
+        for b in range(n_bands):
+            band = spectrum.copy()
+            band[(size // 2 >> b) + 1 :] = 0
+            tables[b] = np.fft.irfft(band, n=size)
+        peak = np.abs(tables).max()
+        if peak > 0:
+            tables /= peak
+        return Wavetable(tables)
+
+    def get_bands(self, inc: np.ndarray) -> np.ndarray:
+        """
+        Return index of band-limited table for every note.
+
+        :param inc: Table cycles per sample of every note
+        """
+        n_bands, size = self.tables.shape
+        if n_bands == 1:
+            return np.zeros(len(inc), dtype=np.int64)
+        bands = np.ceil(np.log2(np.maximum(inc * size, 1)))
+        return np.minimum(bands, n_bands - 1).astype(np.int64)
+
+    def lookup(
+        self, phase: np.ndarray, inc: np.ndarray, lengths: np.ndarray
+    ) -> np.ndarray:
+        """
+        Look up samples of consecutive notes.
+
+        :param phase: Phase of every sample in table cycles, within [0, 1)
+        :param inc: Table cycles per sample of every note
+        :param lengths: Number of samples of every note
+        """
+        size = self.tables.shape[1]
+        idx = np.empty(len(phase), dtype=np.int32)
+        np.multiply(phase, size, out=idx, casting="unsafe")
+        np.minimum(idx, size - 1, out=idx)
+        if len(self.tables) > 1:
+            # Add offset of band-limited table in place, note by note
+            start = 0
+            for band, length in zip(self.get_bands(inc).tolist(), lengths.tolist()):
+                if band:
+                    idx[start : start + length] += band * size
+                start += length
+        return self.flat[idx]
+
+
+def get_lfsr_levels(width: int = 15) -> np.ndarray:
+    """
+    Return output levels of the noise LFSR over one period.
+
+    The hardware starts from 0, shifts right and feeds back the XNOR of the two
+    lowest bits, outputting the inverted lowest bit. This is tracked here on the
+    complemented register, which starts from all ones and feeds back the XOR.
+
+    :param width: Register width, 15 or 7
+    """
+    lfsr = (1 << width) - 1
+    levels = np.empty(2**width - 1, dtype=np.float32)
+    for i in range(len(levels)):
+        levels[i] = 1 if lfsr & 1 else -1
+        feedback = (lfsr ^ (lfsr >> 1)) & 1
+        lfsr = (lfsr >> 1) | (feedback << (width - 1))
+    return levels
+
+
+@lru_cache(maxsize=None)
+def _get_wavetable(waveform: str, wave_ram: Tuple[int, ...]) -> Wavetable:
+    if waveform in PULSE_DUTIES:
+        return Wavetable.from_cycle(PULSE_DUTIES[waveform])
+    if waveform == "wave":
+        if len(wave_ram) != 32 or not all(0 <= x < 16 for x in wave_ram):
+            raise ValueError("Wave RAM must consist of 32 samples of 4 bits")
+        return Wavetable.from_cycle(wave_ram)
+    if waveform in NOISE_WIDTHS:
+        levels = get_lfsr_levels(NOISE_WIDTHS[waveform])
+        return Wavetable(levels[None, :], rate=NOISE_STEPS / len(levels))
+    raise ValueError(f"Unknown waveform {waveform!r}")
+
+
+def get_wavetable(
+    waveform: str, wave_ram: Optional[Tuple[int, ...]] = None
+) -> Wavetable:
+    """
+    Return wavetable of a Game Boy channel, built once and cached.
+
+    Pulse waveforms are named by their duty cycle, e.g. "pulse12" for 12.5%. The
+    wave channel plays the 32 4-bit samples of wave RAM. The noise channel plays
+    the LFSR sequence in long ("noise") or short ("noise7") mode, clocked at 127
+    times the frequency of the note, so short mode has the pitch of the note.
+
+    :param waveform: One of APU_WAVEFORMS
+    :param wave_ram: Samples of the wave channel, defaults to DEFAULT_WAVE_RAM
+    """
+    return _get_wavetable(
+        waveform, tuple(wave_ram) if wave_ram is not None else DEFAULT_WAVE_RAM
+    )
@@ -0,0 +1,181 @@
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from .const import NOTE_FREQS, NOTE_INDEX, NOTES
+from .types import Note, Score
+from .utils import TICKS_PER_BEAT, from_ticks
+
+# Pitch markers for notes that are not single pitches
+REST = int(np.iinfo(np.int16).min)
+CHORD = REST + 1
+
+
+class ScoreArray:
+    def __init__(
+        self,
+        pitch: np.ndarray,
+        ticks: np.ndarray,
+        chords: Optional[Dict[int, Tuple[int, ...]]] = None,
+    ):
+        """
+        Columnar score representation backed by NumPy arrays.
+
+        Pitches are MIDI note numbers with REST for rests and CHORD for chords, whose
+        pitches are kept in a side-table indexed by note index. Arrays are used as
+        given without copying and must not be modified afterwards.
+
+        Parsing and processing produce Note objects, so converting from and to
+        scores visits every note in Python. Conversions are therefore linear in the
+        number of notes, not zero-copy, and are best done once at the boundary to
+        the vectorized consumers, e.g., rendering and JSON output.
+
+        :param pitch: MIDI pitch per note
+        :param ticks: Duration per note in ticks
+        :param chords: MIDI pitches of chords by note index
+        """
+        self.pitch = np.asarray(pitch, dtype=np.int16)
+        self.ticks = np.asarray(ticks, dtype=np.int64)
+        assert self.pitch.shape == self.ticks.shape
+        self.chords = chords if chords is not None else {}
+        self._onset = None
+
+    @staticmethod
+    def from_score(score: Union[Score, "ScoreArray"]) -> "ScoreArray":
+        """
+        Create score array from score in a single pass over its notes.
+
+        :param score: Score to convert
+        """
+        if isinstance(score, ScoreArray):
+            return score
+
+        note_index = NOTE_INDEX
+        pitch = []
+        ticks = []
+        chords = {}
+        for i, note_i in enumerate(score):
+            note = note_i.note
+            octave = note_i.octave
+            if isinstance(note, str):
+                pitch.append(
+                    REST if note == "r" else 12 * (octave + 1) + note_index[note]
+                )
+            else:
+                pitch.append(CHORD)
+                chords[i] = tuple(
+                    12 * (o + 1) + note_index[n] for n, o in zip(note, octave)
+                )
+            ticks.append(note_i.ticks)
+        return ScoreArray(
+            np.array(pitch, dtype=np.int16), np.array(ticks, dtype=np.int64), chords
+        )
+
+    def to_score(self) -> Score:
+        """
+        Convert to score, creating a Note object for every note.
+        """
+        return Score(list(self))
+
+    @property
+    def dur(self) -> np.ndarray:
+        """
+        Return duration of every note in beats.
+        """
+        return self.ticks / TICKS_PER_BEAT
+
+    @property
+    def onset_ticks(self) -> np.ndarray:
+        """
+        Return onset of every note in ticks.
+        """
+        if self._onset is None:
+            self._onset = np.concatenate(([0], np.cumsum(self.ticks)[:-1]))
+        return self._onset
+
+    @property
+    def onset(self) -> np.ndarray:
+        """
+        Return onset of every note in beats.
+        """
+        return self.onset_ticks / TICKS_PER_BEAT
+
+    @property
+    def is_rest(self) -> np.ndarray:
+        """
+        Return mask of rests.
+        """
+        return self.pitch == REST
+
+    def get_freqs(self, octave_offset: int) -> np.ndarray:
+        """
+        Return frequency of every note as played by Player, 0 for rests.
+
+        Chords are played using their first pitch.
+
+        :param octave_offset: Overall octave offset
+        """
+        pitch = self.pitch.astype(np.float64)
+        for i, chord in self.chords.items():
+            pitch[i] = chord[0]
+        freqs = NOTE_FREQS[0] * 2 ** ((pitch - 12 * (octave_offset + 1)) / 12)
+        freqs[self.pitch == REST] = 0
+        return freqs
+
+    def get_total_ticks(self) -> int:
+        """
+        Return total duration of score in ticks.
+        """
+        return int(self.ticks.sum())
+
+    def get_total_dur(self) -> float:
+        """
+        Return total duration of score.
+        """
+        return from_ticks(self.get_total_ticks())
+
+    def _make_note(self, i: int, pitch: int, ticks: int) -> Note:
+        if pitch == REST:
+            return Note._from_trusted("r", None, ticks)
+        if pitch == CHORD:
+            chord = self.chords[i]
+            return Note._from_trusted(
+                [NOTES[p % 12] for p in chord], [p // 12 - 1 for p in chord], ticks
+            )
+        return Note._from_trusted(NOTES[pitch % 12], pitch // 12 - 1, ticks)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Note, "ScoreArray"]:
+        if isinstance(key, slice):
+            start, _, step = key.indices(len(self))
+            idxs = range(len(self))[key]
+            chords = {
+                (i - start) // step: c for i, c in self.chords.items() if i in idxs
+            }
+            return ScoreArray(self.pitch[key], self.ticks[key], chords)
+        i = range(len(self))[key]
+        return self._make_note(i, int(self.pitch[i]), int(self.ticks[i]))
+
+    def __iter__(self) -> Iterator[Note]:
+        pitches = self.pitch.tolist()
+        for i, (pitch, ticks) in enumerate(zip(pitches, self.ticks.tolist())):
+            yield self._make_note(i, pitch, ticks)
+
+    def __len__(self):
+        return len(self.pitch)
+
+    def __repr__(self):
+        return (
+            f"ScoreArray(pitch={self.pitch!r}, ticks={self.ticks!r}, "
+            f"chords={self.chords!r})"
+        )
+
+
+def as_score(score: Union[Score, ScoreArray]) -> Score:
+    """
+    Return score, converting score arrays.
+
+    :param score: Score or score array
+    """
+    if isinstance(score, ScoreArray):
+        return score.to_score()
+    return score
@@ -0,0 +1,385 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from .arrays import ScoreArray
+from .types import Score
+
+_logger = logging.getLogger(__name__)
+
+# Age after which temporary files of interrupted writes are removed
+STALE_TMP_SECONDS = 3600
+
+# Errors raised when loading corrupt entries or entries of outdated classes
+_STALE_ERRORS = (
+    EOFError,
+    pickle.UnpicklingError,
+    AttributeError,
+    ImportError,
+    IndexError,
+    TypeError,
+    ValueError,
+)
+
+
+def hash_rom(rom: bytes) -> str:
+    """
+    Return content hash of a rom.
+
+    :param rom: Rom contents
+    """
+    return hashlib.sha1(rom).hexdigest()
+
+
+class ScoreCache:
+    def __init__(self, directory: str, max_bytes: int = 64 * 2**20):
+        """
+        Cache parsed scores on disk with LRU eviction.
+
+        Entries are written atomically, so multiple processes can share a cache
+        directory. Recency is tracked through file modification times. Entries that
+        cannot be loaded, e.g., after the score classes changed, count as misses and
+        are removed.
+
+        :param directory: Cache directory
+        :param max_bytes: Maximum total size of cache entries
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pkl")
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, key: str) -> Optional[Score]:
+        """
+        Return cached score or None if key is not cached.
+
+        :param key: Cache key
+        """
+        pth = self._path(key)
+        try:
+            with open(pth, "rb") as f:
+                score = pickle.load(f)
+            os.utime(pth)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except _STALE_ERRORS as e:
+            _logger.debug("Removing unloadable cache entry %s: %r", key, e)
+            self._remove(pth)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return score
+
+    def _remove(self, pth: str) -> None:
+        try:
+            size = os.path.getsize(pth)
+            os.remove(pth)
+        except FileNotFoundError:
+            return  # removed by another process
+        self._size -= size
+
+    def _remove_stale_tmp(self) -> None:
+        # Temporary files of writers that were killed before replacing the entry
+        deadline = time.time() - STALE_TMP_SECONDS
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def put(self, key: str, score: Score) -> None:
+        """
+        Store score in cache.
+
+        :param key: Cache key
+        :param score: Score to store
+        """
+        pth = self._path(key)
+        fd, tmp_pth = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(score, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_pth)
+            try:
+                size -= os.path.getsize(pth)  # replaced entry
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_pth, pth)
+            self._size += size
+        except BaseException:
+            if os.path.exists(tmp_pth):
+                os.remove(tmp_pth)
+            raise
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until cache fits into size bound.
+
+        Temporary files of interrupted writes are removed as well.
+        """
+        self._remove_stale_tmp()
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        self._size = sum(size for _, _, size in entries)
+        for pth, _, size in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(pth)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass  # evicted by another process
+            self._size -= size
+        _logger.debug("Cache size after eviction: %d bytes", self._size)
+
+    def clear(self) -> None:
+        """
+        Remove all entries and temporary files of interrupted writes.
+        """
+        self._remove_stale_tmp()
+        for pth, _, _ in list(self._entries()):
+            try:
+                os.remove(pth)
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and size of cache.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._size,
+        }
+
+
+CachedType = Union[Score, ScoreArray, Tuple[Union[Score, ScoreArray], ...]]
+
+
+def _share(value: CachedType) -> CachedType:
+    # Scores are handed out as copy-on-write copies, score arrays are immutable
+    if isinstance(value, tuple):
+        return tuple(_share(v) for v in value)
+    if isinstance(value, Score):
+        return value.copy()
+    return value
+
+
+class ProcessingCache:
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 2**20,
+    ):
+        """
+        Cache of intermediate processing results in memory and optionally on disk.
+
+        Results are keyed by the key of the input score, the op name and its
+        canonicalized arguments, so a chain of ops yields a chain of keys and
+        editing one op only invalidates the results from there on.
+
+        :param directory: Directory of persistent cache, memory only if None
+        :param max_entries: Maximum number of results kept in memory
+        :param max_bytes: Maximum total size of cache entries on disk
+        """
+        self.max_entries = max_entries
+        self.disk = ScoreCache(directory, max_bytes) if directory is not None else None
+        self._memory: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_score(score: Union[Score, ScoreArray]) -> str:
+        """
+        Return content hash of a score, the same for scores and score arrays.
+
+        :param score: Score or score array
+        """
+        array = ScoreArray.from_score(score)
+        h = hashlib.sha1(array.pitch.tobytes())
+        h.update(array.ticks.tobytes())
+        h.update(repr(sorted(array.chords.items())).encode())
+        return h.hexdigest()
+
+    @staticmethod
+    def make_key(parent: str, name: str, args: Dict[str, Any]) -> str:
+        """
+        Return key of result of an op.
+
+        :param parent: Key or content hash of input
+        :param name: Op name
+        :param args: Op arguments
+        """
+        canonical = json.dumps(args, sort_keys=True, default=repr)
+        return hashlib.sha1(f"{parent}|{name}|{canonical}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedType]:
+        """
+        Return cached result or None if key is not cached.
+
+        :param key: Cache key
+        """
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        elif self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self._put_memory(key, value)
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _share(value)
+
+    def put(self, key: str, value: CachedType) -> None:
+        """
+        Store result in cache.
+
+        :param key: Cache key
+        :param value: Score, score array or tuple of them
+        """
+        self._put_memory(key, _share(value))
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def _put_memory(self, key: str, value: CachedType) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters of cache.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._memory),
+        }
+
+
+class NoteCache:
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 64 * 2**20):
+        """
+        In-memory LRU cache of rendered note segments.
+
+        Segments are keyed by everything that determines their samples, e.g.,
+        frequency, length in samples, waveform, volume, cut and sampling rate. The
+        cache is thread-safe, so channels can be rendered concurrently.
+
+        :param max_entries: Maximum number of segments
+        :param max_bytes: Maximum total size of segments
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.n_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[np.ndarray]:
+        """
+        Return cached segment or None if key is not cached.
+
+        :param key: Cache key
+        """
+        with self._lock:
+            value = self._memory.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: np.ndarray) -> None:
+        """
+        Store segment in cache, unless it is larger than the cache.
+
+        The segment is made read-only, as it is shared by all renders.
+
+        :param key: Cache key
+        :param value: Rendered segment
+        """
+        if value.nbytes > self.max_bytes:
+            return
+        value.flags.writeable = False
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self.n_bytes -= old.nbytes
+            self._memory[key] = value
+            self.n_bytes += value.nbytes
+            while len(self._memory) > self.max_entries or self.n_bytes > self.max_bytes:
+                _, old = self._memory.popitem(last=False)
+                self.n_bytes -= old.nbytes
+
+    def clear(self) -> None:
+        """
+        Remove all segments and reset counters.
+        """
+        with self._lock:
+            self._memory.clear()
+            self.n_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and memory use of cache.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._memory),
+            "bytes": self.n_bytes,
+        }
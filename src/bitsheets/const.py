@@ -14,3 +14,6 @@ NOTES = [
 ]
 
 NOTE_FREQS = [523.2508 * 2 ** (i / 12) for i in range(len(NOTES))]
+
+# Pitch class of every note name
+NOTE_INDEX = {note: i for i, note in enumerate(NOTES)}
@@ -2,9 +2,9 @@ import logging
 import string
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-from .theory import get_most_likely_key
+from .theory import KeyType, get_key_sections, get_most_likely_key
 from .types import GroupingElement, GroupingType, IntFloat, Note, Score, ScoresType
-from .utils import align_duration, is_close_to_round
+from .utils import TICKS_PER_BEAT, from_ticks, is_close_to_round, to_ticks
 
 _logger = logging.getLogger(__name__)
 
@@ -211,6 +211,7 @@ def _get_lilypond_staff(
     fill_end: bool = True,
     time_base: int = 4,
     bars: Optional[Dict[IntFloat, str]] = None,
+    keys: Optional[Dict[IntFloat, KeyType]] = None,
 ) -> str:
     """
     Convert score to lilypond format.
@@ -224,9 +225,11 @@ def _get_lilypond_staff(
     :param fill_end: Whether to fill the end with rests up to the next full bar
     :param time_base: Base duration for time signature
     :param bars: Additional bars (e.g., repeats) to add
+    :param keys: Key changes as (tonic, mode) by beat from beginning of score
     """
     notes = []
-    total_dur = 0
+    total_ticks = 0  # exact position in score
+    bar_ticks = bar_length * TICKS_PER_BEAT
 
     time_multiplier = bar_length / beats_per_whole
     notes.append(
@@ -236,9 +239,14 @@ def _get_lilypond_staff(
     if bars is None:
         bars = {}
 
+    # Key changes by position on staff, which starts after the anacrusis
+    key_changes = {
+        to_ticks(beat) - to_ticks(anacrusis): key for beat, key in (keys or {}).items()
+    }
+
     if anacrusis > 0:
         assert anacrusis < bar_length
-        total_dur = -anacrusis
+        total_ticks = -to_ticks(anacrusis)
         lp_anacrusis = beats_per_whole / anacrusis
         assert lp_anacrusis.is_integer()
         notes.append(LilyPondCommand(f"\\partial {int(lp_anacrusis)}"))
@@ -248,7 +256,7 @@ def _get_lilypond_staff(
     tuplet_len = None
 
     def _add_lilypond_note(note: Note):
-        nonlocal total_dur
+        nonlocal total_ticks
         nonlocal tuplet_cnt
         nonlocal tuplet_len
 
@@ -259,7 +267,7 @@ def _get_lilypond_staff(
         while rem > 0:
             div_prev = div
             # Determine longest part of note we could write
-            div, rem = _get_biggest_divisor(rem, total_dur, bar_length)
+            div, rem = _get_biggest_divisor(rem, from_ticks(total_ticks), bar_length)
 
             if tuplet_len is None and rem < 0:
                 tuplet_cnt = -rem
@@ -275,7 +283,7 @@ def _get_lilypond_staff(
                 tuplet_cnt -= 1
 
             if div == div_prev / 2:
-                if total_dur % bar_length == 0:
+                if total_ticks % bar_ticks == 0:
                     # Across bars
                     notes.append(
                         LilyPondNote(note.note, note.octave, dur=beats_per_whole / div)
@@ -293,25 +301,28 @@ def _get_lilypond_staff(
                 notes[-1].make_tied()
 
             if tuplet_len is not None:
-                # Correct before adding to total_dur
+                # Correct before adding to total_ticks
                 div *= (tuplet_len - 1) / tuplet_len
 
-            total_dur = align_duration(total_dur + div)
+            total_ticks += to_ticks(div)
 
-            if total_dur / bar_length in bars:
-                notes.append(LilyPondBar(bars[total_dur / bar_length]))
+            if total_ticks / bar_ticks in bars:
+                notes.append(LilyPondBar(bars[total_ticks / bar_ticks]))
 
             if tuplet_cnt == 0:
                 # Close tuplet
-                assert is_close_to_round(total_dur, 1)
-                total_dur = round(total_dur, 1)
+                assert total_ticks % (TICKS_PER_BEAT // 10) == 0
                 tuplet_cnt = None
                 tuplet_len = None
                 notes.append(LilyPondCommand("}"))
 
-            if total_dur % bar_length == 0 and not isinstance(notes[-1], LilyPondBar):
+            if total_ticks % bar_ticks == 0 and not isinstance(notes[-1], LilyPondBar):
                 notes.append(LilyPondBar())
 
+            if total_ticks in key_changes:
+                tonic, mode = key_changes[total_ticks]
+                notes.append(LilyPondCommand(f"\\key {tonic} \\{mode}"))
+
     for note in score:
         _add_lilypond_note(note)
 
@@ -322,18 +333,18 @@ def _get_lilypond_staff(
         lpc = LilyPondCommand(f"\\partial {int(lp_anacrusis)}")
         notes.append(lpc)
 
-        total_dur += anacrusis
-        if total_dur % bar_length == 0:
+        total_ticks += to_ticks(anacrusis)
+        if total_ticks % bar_ticks == 0:
             notes.append(LilyPondBar())
 
-    if fill_end and total_dur % bar_length != 0:
-        rem_dur = bar_length - total_dur % bar_length
-        _add_lilypond_note(Note(note="r", octave=None, dur=rem_dur))
+    if fill_end and total_ticks % bar_ticks != 0:
+        rem_ticks = bar_ticks - total_ticks % bar_ticks
+        _add_lilypond_note(Note._from_trusted("r", None, rem_ticks))
 
     assert isinstance(notes[-1], LilyPondBar)
     notes[-1].make_end(repeat)
 
-    _logger.info("Staff with total duration %d", total_dur)
+    _logger.info("Staff with total duration %d", from_ticks(total_ticks))
 
     return "{\n " + " ".join(str(note) for note in notes) + "}"
 
@@ -394,7 +405,23 @@ def dump_scores_lilypond(
     """
     grouping = parse_grouping(sheets_config)
     tempo = sheets_config.get("tempo", 80)
-    key = sheets_config.get("key", get_most_likely_key(scores))
+    staff_args = sheets_config.get("staff_args", {})
+
+    key = sheets_config.get("key")
+    key_changes = {}
+    if key is None and sheets_config.get("key_sections"):
+        # Detect key per section of given number of bars
+        n_bars = sheets_config["key_sections"]
+        n_bars = 4 if n_bars is True else n_bars
+        sections = get_key_sections(
+            scores,
+            window=n_bars * staff_args.get("bar_length", 16),
+            anacrusis=staff_args.get("anacrusis", 0),
+        )
+        key = sections[0].key
+        key_changes = {section.start: section.key for section in sections[1:]}
+    elif key is None:
+        key = get_most_likely_key(scores, sheets_config.get("key_method", "scale"))
 
     with open(pth, "w") as f:
         f.write('\\version "2.22.2"')
@@ -406,7 +433,7 @@ def dump_scores_lilypond(
         for i, score in enumerate(scores):
             if i in channels:  # skip voices that are not in grouping
                 staff = _get_lilypond_staff(
-                    score, octave_offset, **sheets_config.get("staff_args", {})
+                    score, octave_offset, keys=key_changes, **staff_args
                 )
                 f.write(f"\nchannel{abc[i]} = {staff}")
 
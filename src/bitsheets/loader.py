@@ -1,26 +1,155 @@
+import mmap
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
 import yaml
 
+from .cache import ScoreCache
 from .parser import PokemonRBYParser
 from .types import ScoresType
 
 
-def get_scores_pokemon_rby(rom_pth: str, ptrs_pth: str, music: str) -> ScoresType:
+class TrackResult(NamedTuple):
+    track: str
+    scores: Optional[ScoresType]
+    seconds: float
+    error: Optional[str] = None
+
+
+class RomLibrary:
+    def __init__(self, rom_pth: str, ptrs_pth: str, cache_dir: Optional[str] = None):
+        """
+        Long-lived session for loading many tracks from the same rom.
+
+        The rom file is memory-mapped once and the pointers file is parsed once, so
+        loading another track only costs decoding.
+
+        :param rom_pth: Path to rom file
+        :param ptrs_pth: Path to pointers file
+        :param cache_dir: Directory of persistent score cache, disabled if None
+        """
+        self.rom_pth = rom_pth
+        self.ptrs_pth = ptrs_pth
+
+        with open(ptrs_pth, "r") as f:
+            self.music_ptrs: Dict[str, dict] = yaml.safe_load(f)
+
+        with open(rom_pth, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.rom = memoryview(self._mmap)
+        self._banks: Dict[int, memoryview] = {}
+
+        self.cache = ScoreCache(cache_dir) if cache_dir is not None else None
+        self.parser = PokemonRBYParser(self.rom, cache=self.cache)
+
+    @property
+    def tracks(self) -> List[str]:
+        """
+        Return names of all tracks in the pointers file.
+        """
+        return list(self.music_ptrs)
+
+    def get_bank(self, ptr_offset: int) -> memoryview:
+        """
+        Return zero-copy view of the rom such that view[ptr] is rom[ptr_offset + ptr].
+
+        :param ptr_offset: Bank-specific pointer offset
+        """
+        if ptr_offset not in self._banks:
+            self._banks[ptr_offset] = self.rom[ptr_offset:]
+        return self._banks[ptr_offset]
+
+    def get_scores(self, music: str) -> ScoresType:
+        """
+        Load scores of a track.
+
+        :param music: Which track to load
+        """
+        return self.parser.get_scores(self.music_ptrs[music])
+
+    def close(self) -> None:
+        """
+        Release all views and unmap the rom.
+        """
+        for bank in self._banks.values():
+            bank.release()
+        self._banks.clear()
+        self.rom.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_scores_pokemon_rby(
+    rom_pth: str, ptrs_pth: str, music: str, cache_dir: Optional[str] = None
+) -> ScoresType:
     """
     Load scores from Pokemon RBY rom.
 
     :param rom_pth: Path to rom file
     :param ptrs_path: Path to pointers file
     :param music: Which track to load
+    :param cache_dir: Directory of persistent score cache, disabled if None
+    """
+    with RomLibrary(rom_pth, ptrs_pth, cache_dir=cache_dir) as library:
+        return library.get_scores(music)
+
+
+# Per-process session used by pool workers
+_worker_library: Optional[RomLibrary] = None
+
+
+def _init_worker(rom_pth: str, ptrs_pth: str, cache_dir: Optional[str]) -> None:
+    global _worker_library
+    _worker_library = RomLibrary(rom_pth, ptrs_pth, cache_dir=cache_dir)
+
+
+def _load_track(track: str) -> TrackResult:
+    start = time.perf_counter()
+    try:
+        scores = _worker_library.get_scores(track)
+    except Exception:
+        return TrackResult(
+            track, None, time.perf_counter() - start, traceback.format_exc()
+        )
+    return TrackResult(track, scores, time.perf_counter() - start)
+
+
+def iter_scores_pokemon_rby(
+    rom_pth: str,
+    ptrs_pth: str,
+    tracks: Optional[List[str]] = None,
+    processes: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> Iterator[TrackResult]:
     """
-    with open(rom_pth, "rb") as f:
-        rom = f.read()
+    Load scores of many tracks in parallel and yield results as they complete.
 
-    with open(ptrs_pth, "r") as f:
-        music_ptrs = yaml.safe_load(f)
+    Every worker process maps the rom file itself, so the rom is shared read-only
+    through the page cache instead of being sent to the workers. Errors are caught
+    per track and reported in the result.
 
-    parser = PokemonRBYParser(rom)
+    :param rom_pth: Path to rom file
+    :param ptrs_pth: Path to pointers file
+    :param tracks: Which tracks to load, defaults to all tracks in pointers file
+    :param processes: Number of worker processes, defaults to number of cpus
+    :param cache_dir: Directory of persistent score cache, disabled if None
+    """
+    if tracks is None:
+        with open(ptrs_pth, "r") as f:
+            tracks = list(yaml.safe_load(f))
 
-    return [
-        parser.parse_from_pointer(ptr=ptr, ptr_offset=music_ptrs[music]["ptr_offset"])
-        for ptr in music_ptrs[music]["channels"]
-    ]
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_worker,
+        initargs=(rom_pth, ptrs_pth, cache_dir),
+    ) as executor:
+        futures = [executor.submit(_load_track, track) for track in tracks]
+        for future in as_completed(futures):
+            yield future.result()
@@ -1,9 +1,24 @@
 import json
+import mmap
+import os
+import struct
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
-from mido import Message, MidiFile, MidiTrack
+import numpy as np
+import yaml
 
+from .arrays import CHORD, REST, ScoreArray
 from .const import NOTES
-from .types import ScoresType
+from .loader import RomLibrary
+from .player import Mixer, Player, to_int16
+from .types import Score, ScoresType
+from .utils import TICKS_PER_BEAT
+
+# Size of the RIFF, format and data chunk headers of a PCM WAV file
+WAV_HEADER_SIZE = 44
 
 
 def get_midi_note(note: str, octave: int) -> int:
@@ -37,19 +52,147 @@ def dump_scores_json(scores: ScoresType, pth: str) -> None:
     :param scores: Scores to dump
     :param pth: Output path
     """
+
+    def _dump_score(score):
+        if isinstance(score, ScoreArray):
+            piano = score.pitch.astype(int) - 21
+            piano[(score.pitch == REST) | (score.pitch == CHORD)] = -1
+            return [list(pd) for pd in zip(piano.tolist(), score.dur.tolist())]
+        return [[get_piano_note(note, octave), dur] for note, octave, dur in score]
+
     with open(pth, "w") as f:
-        json.dump(
-            [
-                [[get_piano_note(note, octave), dur] for note, octave, dur in score]
-                for score in scores
-            ],
-            f,
-            indent=2,
+        json.dump([_dump_score(score) for score in scores], f, indent=2)
+
+
+def _encode_vlq(value: int) -> bytes:
+    """
+    Encode integer as MIDI variable-length quantity.
+
+    :param value: Non-negative integer below 2 ** 28
+    """
+    if not 0 <= value < 2**28:
+        raise ValueError(f"Cannot encode {value} as variable-length quantity")
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _make_chunk(kind: bytes, data: Union[bytes, bytearray]) -> bytes:
+    return kind + struct.pack(">I", len(data)) + data
+
+
+class MidiWriter:
+    def __init__(
+        self,
+        ticks_per_beat: int = 480,
+        dur_multiplier: int = 128,
+        velocity: int = 64,
+        tempo: int = 500000,
+    ):
+        """
+        Writer of Standard MIDI Files (format 1) straight to bytes.
+
+        The first track only sets the tempo, every score becomes one further track.
+        Chords start and stop all of their pitches at once. Encoded events are
+        cached by delta time, pitch and duration, so repeated notes across scores
+        and files are encoded once.
+
+        :param ticks_per_beat: MIDI ticks per quarter note
+        :param dur_multiplier: Conversion multiplier from score speed to MIDI speed
+        :param velocity: MIDI stroke velocity
+        :param tempo: Microseconds per quarter note
+        """
+        self.ticks_per_beat = ticks_per_beat
+        self.dur_multiplier = dur_multiplier
+        self.velocity = velocity
+        self.tempo = tempo
+        self._vlq: Dict[int, bytes] = {}
+        self._events: Dict[Tuple[int, int, int], bytes] = {}
+
+    def _get_vlq(self, value: int) -> bytes:
+        vlq = self._vlq.get(value)
+        if vlq is None:
+            vlq = self._vlq[value] = _encode_vlq(value)
+        return vlq
+
+    def _get_note_events(self, delta: int, pitch: int, duration: int) -> bytes:
+        key = (delta, pitch, duration)
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = (
+                self._get_vlq(delta)
+                + bytes((0x90, pitch, self.velocity))
+                + self._get_vlq(duration)
+                + bytes((0x80, pitch, self.velocity))
+            )
+        return events
+
+    def _get_tempo_track(self) -> bytes:
+        return _make_chunk(
+            b"MTrk",
+            b"\x00\xff\x51\x03" + self.tempo.to_bytes(3, "big") + b"\x00\xff\x2f\x00",
         )
 
+    def _get_score_track(self, score: Union[Score, ScoreArray]) -> bytes:
+        array = ScoreArray.from_score(score)
+        durations = (array.ticks * self.dur_multiplier // TICKS_PER_BEAT).tolist()
+        chords = array.chords
+        velocity = self.velocity
+
+        data = bytearray()
+        delta = 0
+        for i, (pitch, duration) in enumerate(zip(array.pitch.tolist(), durations)):
+            if pitch == REST:
+                delta += duration
+            elif pitch == CHORD:
+                pitches = chords[i]
+                for j, p in enumerate(pitches):
+                    data += self._get_vlq(0 if j else delta)
+                    data += bytes((0x90, p, velocity))
+                for j, p in enumerate(pitches):
+                    data += self._get_vlq(0 if j else duration)
+                    data += bytes((0x80, p, velocity))
+                delta = 0
+            else:
+                data += self._get_note_events(delta, pitch, duration)
+                delta = 0
+        # Trailing rests keep the length of the track
+        data += self._get_vlq(delta) + b"\xff\x2f\x00"
+        return _make_chunk(b"MTrk", data)
+
+    def to_bytes(self, scores: ScoresType) -> bytes:
+        """
+        Return MIDI file of scores.
+
+        :param scores: Scores to encode
+        """
+        header = _make_chunk(
+            b"MThd", struct.pack(">HHH", 1, len(scores) + 1, self.ticks_per_beat)
+        )
+        tracks = [self._get_tempo_track()]
+        tracks.extend(self._get_score_track(score) for score in scores)
+        return b"".join([header] + tracks)
+
+    def dump(self, scores: ScoresType, pth: str) -> None:
+        """
+        Dump scores to MIDI file.
+
+        :param scores: Scores to dump
+        :param pth: Output path
+        """
+        with open(pth, "wb") as f:
+            f.write(self.to_bytes(scores))
+
 
 def dump_scores_midi(
-    scores: ScoresType, pth: str, dur_multiplier: int = 128, velocity: int = 64
+    scores: ScoresType,
+    pth: str,
+    dur_multiplier: int = 128,
+    velocity: int = 64,
+    tempo: int = 500000,
 ) -> None:
     """
     Dump scores to MIDI file.
@@ -58,29 +201,252 @@ def dump_scores_midi(
     :param pth: Output path
     :param dur_multiplier: Conversion multiplier from score speed to MIDI speed
     :param velocity: MDID stroke velocity
+    :param tempo: Microseconds per quarter note
     """
-    outfile = MidiFile(type=1)
+    MidiWriter(dur_multiplier=dur_multiplier, velocity=velocity, tempo=tempo).dump(
+        scores, pth
+    )
 
-    delta = 0
-    for score in scores:
-        track = MidiTrack()
-        outfile.tracks.append(track)
 
-        for note, octave, dur in score:
-            duration = int(dur_multiplier * dur)
-            if note not in NOTES:
-                delta += duration
-                continue
-            else:
-                midi_note = get_midi_note(note, octave)
-                track.append(
-                    Message("note_on", note=midi_note, velocity=velocity, time=delta)
-                )
-                delta = 0
-                track.append(
-                    Message(
-                        "note_off", note=midi_note, velocity=velocity, time=duration
-                    )
-                )
+def dump_tracks_midi(
+    tracks: Dict[str, ScoresType], out_pth: str, **kwargs
+) -> Dict[str, str]:
+    """
+    Dump scores of many tracks to MIDI files named after the tracks.
+
+    All files share one writer, so events are encoded once across tracks.
+
+    :param tracks: Scores by track name
+    :param out_pth: Output directory
+    :param kwargs: Further arguments of MidiWriter
+    """
+    os.makedirs(out_pth, exist_ok=True)
+    writer = MidiWriter(**kwargs)
+    pths = {}
+    for track, scores in tracks.items():
+        pths[track] = os.path.join(out_pth, f"{track}.mid")
+        writer.dump(scores, pths[track])
+    return pths
+
+
+class WavWriter:
+    def __init__(
+        self,
+        pth: str,
+        fs: int,
+        n_samples: Optional[int] = None,
+        use_mmap: bool = False,
+    ):
+        """
+        Incremental writer of 16-bit mono WAV files.
+
+        Samples are appended block by block and the sizes in the header are written
+        on close, so the length does not need to be known in advance. With
+        use_mmap, the file is preallocated for n_samples samples and blocks are
+        copied into a memory map of it.
+
+        :param pth: Output path
+        :param fs: Sampling rate
+        :param n_samples: Number of samples, required for use_mmap
+        :param use_mmap: Whether to write through a memory map
+        """
+        if use_mmap and n_samples is None:
+            raise ValueError("Writing through a memory map requires n_samples")
+        self.pth = pth
+        self.fs = fs
+        self.n_samples = n_samples
+        self.n_written = 0
+
+        self._file = open(pth, "wb+")
+        self._file.write(self._get_header(n_samples or 0))
+        self._mmap = None
+        self._view = None
+        if use_mmap and n_samples > 0:
+            self._file.truncate(WAV_HEADER_SIZE + 2 * n_samples)
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            self._view = np.frombuffer(
+                self._mmap, dtype="<i2", count=n_samples, offset=WAV_HEADER_SIZE
+            )
+
+    def _get_header(self, n_samples: int) -> bytes:
+        n_bytes = 2 * n_samples
+        if WAV_HEADER_SIZE - 8 + n_bytes >= 2**32:
+            raise ValueError("Too many samples for a WAV file")
+        return struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF",
+            WAV_HEADER_SIZE - 8 + n_bytes,
+            b"WAVE",
+            b"fmt ",
+            16,  # size of format chunk
+            1,  # PCM
+            1,  # channels
+            self.fs,
+            2 * self.fs,  # bytes per second
+            2,  # bytes per frame
+            16,  # bits per sample
+            b"data",
+            n_bytes,
+        )
+
+    def write(self, w: np.ndarray) -> None:
+        """
+        Append samples.
+
+        :param w: Wave array, converted to little-endian int16
+        """
+        data = np.asarray(w, dtype="<i2")
+        if self._view is not None:
+            if self.n_written + len(data) > self.n_samples:
+                raise ValueError("More samples than preallocated")
+            self._view[self.n_written : self.n_written + len(data)] = data
+        else:
+            self._file.write(data.tobytes())
+        self.n_written += len(data)
+
+    def close(self) -> None:
+        """
+        Write final sizes to header and close file.
+        """
+        if self._file.closed:
+            return
+        if self._mmap is not None:
+            # Release the view first, a map with exported buffers cannot be closed
+            self._view = None
+            self._mmap.close()
+        if self.n_samples is not None and self.n_written != self.n_samples:
+            self._file.truncate(WAV_HEADER_SIZE + 2 * self.n_written)
+        self._file.seek(0)
+        self._file.write(self._get_header(self.n_written))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def dump_scores_wav(
+    scores: ScoresType,
+    pth: str,
+    player: Optional[Player] = None,
+    gains: Optional[List[float]] = None,
+    headroom: float = 0.9,
+    block_size: int = 2**16,
+    use_mmap: bool = False,
+    **kwargs,
+) -> int:
+    """
+    Render scores to WAV file block by block and return the number of samples.
+
+    Only one block of the mix is held in memory at a time.
+
+    :param scores: Scores to dump
+    :param pth: Output path
+    :param player: Player used for rendering, defaults to a player at 44.1 kHz
+    :param gains: Gain per channel, defaults to 1 for all channels
+    :param headroom: Ceiling of the mix as fraction of int16 full scale
+    :param block_size: Number of samples per block
+    :param use_mmap: Whether to write through a memory map of the output file
+    :param kwargs: Further arguments of Player.iter_blocks
+    """
+    if player is None:
+        player = Player(44100)
+    n_samples = None
+    if use_mmap:
+        n_samples = player.get_n_samples(
+            scores, kwargs.get("loops", 1), kwargs.get("speed", 2.0)
+        )
+
+    mixer = Mixer(player, gains, headroom)
+    with WavWriter(pth, player.fs, n_samples, use_mmap) as writer:
+        for block in mixer.iter_blocks(scores, block_size=block_size, **kwargs):
+            writer.write(to_int16(block))
+    return writer.n_written
+
+
+class WavResult(NamedTuple):
+    track: str
+    pth: Optional[str]
+    n_samples: int
+    seconds: float
+    error: Optional[str] = None
+
+
+# Per-process session and player used by pool workers
+_worker_library: Optional[RomLibrary] = None
+_worker_player: Optional[Player] = None
+
+
+def _init_wav_worker(
+    rom_pth: str,
+    ptrs_pth: str,
+    cache_dir: Optional[str],
+    player_args: Dict[str, Any],
+) -> None:
+    global _worker_library, _worker_player
+    _worker_library = RomLibrary(rom_pth, ptrs_pth, cache_dir=cache_dir)
+    _worker_player = Player(**player_args)
+
+
+def _dump_track_wav(track: str, pth: str, kwargs: Dict[str, Any]) -> WavResult:
+    start = time.perf_counter()
+    try:
+        scores = _worker_library.get_scores(track)
+        n_samples = dump_scores_wav(scores, pth, _worker_player, **kwargs)
+    except Exception:
+        return WavResult(
+            track, None, 0, time.perf_counter() - start, traceback.format_exc()
+        )
+    return WavResult(track, pth, n_samples, time.perf_counter() - start)
+
+
+def iter_dump_tracks_wav(
+    rom_pth: str,
+    ptrs_pth: str,
+    out_pth: str,
+    tracks: Optional[List[str]] = None,
+    processes: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    fs: int = 44100,
+    waveform: Union[str, List[str]] = "sawtooth",
+    **kwargs,
+) -> Iterator[WavResult]:
+    """
+    Render many tracks to WAV files in parallel and yield results as they complete.
+
+    Every worker process maps the rom file itself and streams its tracks to disk,
+    so memory per worker is bounded by the block size. Files are named after the
+    tracks. Errors are caught per track and reported in the result.
+
+    :param rom_pth: Path to rom file
+    :param ptrs_pth: Path to pointers file
+    :param out_pth: Output directory
+    :param tracks: Which tracks to render, defaults to all tracks in pointers file
+    :param processes: Number of worker processes, defaults to number of cpus
+    :param cache_dir: Directory of persistent score cache, disabled if None
+    :param fs: Sampling rate
+    :param waveform: Waveform function to use, or one per channel
+    :param kwargs: Further arguments of dump_scores_wav
+    """
+    if tracks is None:
+        with open(ptrs_pth, "r") as f:
+            tracks = list(yaml.safe_load(f))
 
-    outfile.save(pth)
+    os.makedirs(out_pth, exist_ok=True)
+    player_args = {"fs": fs, "waveform": waveform}
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_wav_worker,
+        initargs=(rom_pth, ptrs_pth, cache_dir, player_args),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _dump_track_wav, track, os.path.join(out_pth, f"{track}.wav"), kwargs
+            )
+            for track in tracks
+        ]
+        for future in as_completed(futures):
+            yield future.result()
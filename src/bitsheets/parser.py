@@ -1,154 +1,694 @@
 import logging
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
+from .cache import ScoreCache, hash_rom
 from .const import NOTES
-from .types import Note, Score, ScoresType
+from .types import IntFloat, Note, Repeat, Score, ScoresType, Sequence
+from .utils import TICKS_PER_BEAT
 
 _logger = logging.getLogger(__name__)
 
+# Bump whenever decoding changes to invalidate cached scores
+PARSER_VERSION = 4
+
+# Opcode kinds, ordered by how often they occur in music data
+OP_NOTE = 0
+OP_REST = 1
+OP_OCTAVE = 2
+OP_SKIP = 3
+OP_SPEED = 4
+OP_LOOP = 5
+OP_CALL = 6
+OP_END = 7
+OP_UNKNOWN = 8
+
+
+class Opcode(NamedTuple):
+    kind: int
+    n_args: int = 0
+    value: Optional[Union[str, int, IntFloat]] = None
+    arg: int = 0
+    desc: str = ""
+
+
+def _decode_byte(byt: int) -> Opcode:
+    """
+    Decode a single command byte.
+
+    :param byt: Command byte
+    """
+    cmd = byt >> 4  # upper 4 bits
+    arg = byt & 0xF  # lower 4 bits
+
+    if byt == 0xDC:
+        # Velocity? Resets speed for 0xd? in next byte
+        return Opcode(OP_SPEED, 1, 1, desc="Velocity")
+    if byt == 0xD6:
+        return Opcode(OP_SPEED, 1, 2, desc="Speed x2")
+    if byt == 0xD8:
+        return Opcode(OP_SPEED, 1, 1.5, desc="Speed x1.5")
+    if byt == 0xEC:
+        # Instrument selection 0xec 0x??
+        return Opcode(OP_SKIP, 1, desc="Instrument")
+    # Not sure what these are
+    if byt == 0xF8:
+        return Opcode(OP_SKIP, 0, desc="Unknown skip 0")
+    if byt in (0xD4, 0xDD, 0xEE, 0xF0, 0xFC):
+        return Opcode(OP_SKIP, 1, desc="Unknown skip 1")
+    if byt in (0xED, 0xEA):
+        return Opcode(OP_SKIP, 2, desc="Unknown skip 2")
+    if byt == 0xEB:
+        return Opcode(OP_SKIP, 3, desc="Unknown skip 3")
+    if byt == 0xFE:
+        # Jump once to pointer in byte 3 and 4 if byte 2 > 0
+        return Opcode(OP_LOOP, 3, desc="Loop")
+    if byt == 0xFD:
+        # Jump to pointer in byte 2 and 3
+        return Opcode(OP_CALL, 2, desc="Call")
+    if byt == 0xFF:
+        return Opcode(OP_END, desc="End")
+    if cmd < 0xC:
+        return Opcode(OP_NOTE, 0, NOTES[cmd % 12], arg, f"Note {NOTES[cmd % 12]}")
+    if cmd == 0xC:
+        return Opcode(OP_REST, 0, "r", arg, "Rest")
+    if cmd == 0xE:
+        return Opcode(OP_OCTAVE, 0, 8 - arg, arg, "Octave")
+    return Opcode(OP_UNKNOWN)
+
+
+# Lookup table of decoded opcodes for every possible byte
+OPCODES: List[Opcode] = [_decode_byte(byt) for byt in range(256)]
+
+# Note durations in ticks for every (speed multiplier, argument) pair
+DURATIONS = {
+    op.value: tuple(round((1 + arg) * TICKS_PER_BEAT / op.value) for arg in range(16))
+    for op in OPCODES
+    if op.kind == OP_SPEED
+}
+
+
+class ControlEvent(NamedTuple):
+    kind: str  # one of "octave", "speed", "loop", "call", "return", "end"
+    addr: int  # absolute address of opcode
+    value: Optional[IntFloat] = None  # new octave/speed or absolute jump target
+
+
+class BasicBlock(NamedTuple):
+    start: int  # absolute address of first opcode
+    ops: Tuple[Opcode, ...]  # straight-line note, rest, octave and speed opcodes
+    addrs: Tuple[int, ...]  # absolute address of each opcode in ops
+    exit: Opcode  # loop, call or end opcode terminating the block
+    exit_ptr: int  # absolute address of arguments of exit opcode
+    count: int  # loop count (loops only)
+    target: Optional[int]  # bank-relative jump target (loops and calls only)
+    skipped: Tuple[Tuple[int, bytes], ...] = ()  # address and bytes of skipped/unknown
+
+
+class TraceRecord(NamedTuple):
+    addr: int  # absolute address of opcode
+    byte: int  # opcode byte
+    desc: str  # decoded meaning
+    target: Optional[int]  # absolute jump target if a jump was taken
+    note_idx: Optional[int]  # index of produced note within channel
+
+
+class ParserTrace:
+    def __init__(self, capacity: int = 2**16):
+        """
+        Ring buffer of executed opcodes with per-channel statistics.
+
+        Records are kept in preallocated arrays, so only the most recent capacity
+        records are retained. Histograms and statistics cover all records. Channels
+        served from the score cache are not decoded, they are counted as cache hits
+        and do not contribute records or opcodes. Structured parses are not traced.
+
+        :param capacity: Number of records to keep
+        """
+        self.capacity = capacity
+        self._addrs = array("l", [0]) * capacity
+        self._targets = array("l", [0]) * capacity
+        self._note_idxs = array("l", [0]) * capacity
+        self._bytes = bytearray(capacity)
+        self.n_records = 0
+
+        self.histogram = [0] * 256
+        self.channels: Dict[Tuple[int, int], dict] = {}
+        self._channel = None
+        self._note_idx = 0
+        self._start_time = 0.0
+
+    def begin_channel(self, ptr: int, ptr_offset: int) -> None:
+        """
+        Start statistics for a channel.
+
+        :param ptr: Start pointer
+        :param ptr_offset: Bank-specific pointer offset
+        """
+        self._channel = self.channels[(ptr_offset, ptr)] = {
+            "bytes": 0,
+            "blocks": 0,
+            "jumps": 0,
+            "notes": 0,
+            "seconds": 0.0,
+            "complete": False,
+            "cached": False,
+        }
+        self._note_idx = 0
+        self._start_time = time.perf_counter()
+
+    def end_channel(self, complete: bool = True) -> None:
+        """
+        Finish statistics for current channel.
+
+        :param complete: Whether the channel was decoded up to its end
+        """
+        self._channel["notes"] = self._note_idx
+        self._channel["seconds"] = time.perf_counter() - self._start_time
+        self._channel["complete"] = complete
+
+    def record_cache_hit(self, ptr: int, ptr_offset: int, n_notes: int) -> None:
+        """
+        Record a channel served from the score cache.
+
+        :param ptr: Start pointer
+        :param ptr_offset: Bank-specific pointer offset
+        :param n_notes: Number of notes of cached score
+        """
+        self.begin_channel(ptr, ptr_offset)
+        self._note_idx = n_notes
+        self.end_channel()
+        self._channel["cached"] = True
+
+    def _record(self, addr: int, byt: int, target: int, note_idx: int) -> None:
+        i = self.n_records % self.capacity
+        self._addrs[i] = addr
+        self._bytes[i] = byt
+        self._targets[i] = target
+        self._note_idxs[i] = note_idx
+        self.histogram[byt] += 1
+        self.n_records += 1
+
+    def record_block(
+        self, rom: Union[bytes, memoryview], block: BasicBlock, target: Optional[int]
+    ) -> None:
+        """
+        Record execution of a basic block.
+
+        :param rom: Rom contents
+        :param block: Executed block
+        :param target: Address execution continues at, None if channel ended
+        """
+        skipped = iter(block.skipped)
+        skip_addr = next(skipped, (None,))[0]
+        for op, addr in zip(block.ops, block.addrs):
+            # Skipped and unknown opcodes in front of this one
+            while skip_addr is not None and skip_addr < addr:
+                self._record(skip_addr, rom[skip_addr], -1, -1)
+                skip_addr = next(skipped, (None,))[0]
+            if op.kind <= OP_REST:
+                self._record(addr, rom[addr], -1, self._note_idx)
+                self._note_idx += 1
+            else:
+                self._record(addr, rom[addr], -1, -1)
+        while skip_addr is not None:
+            self._record(skip_addr, rom[skip_addr], -1, -1)
+            skip_addr = next(skipped, (None,))[0]
+
+        exit_addr = block.exit_ptr - 1
+        self._record(exit_addr, rom[exit_addr], -1 if target is None else target, -1)
+
+        channel = self._channel
+        channel["bytes"] += block.exit_ptr + block.exit.n_args - block.start
+        channel["blocks"] += 1
+        if target is not None:
+            channel["jumps"] += 1
+
+    def records(self) -> List[TraceRecord]:
+        """
+        Return retained records, oldest first.
+        """
+        n = min(self.n_records, self.capacity)
+        start = self.n_records - n
+        records = []
+        for j in range(start, self.n_records):
+            i = j % self.capacity
+            byt = self._bytes[i]
+            target = self._targets[i]
+            note_idx = self._note_idxs[i]
+            records.append(
+                TraceRecord(
+                    self._addrs[i],
+                    byt,
+                    OPCODES[byt].desc or "Unknown",
+                    None if target < 0 else target,
+                    None if note_idx < 0 else note_idx,
+                )
+            )
+        return records
+
+    def summary(self) -> dict:
+        """
+        Return opcode histogram and per-channel statistics.
+        """
+        opcodes = {}
+        for byt, cnt in enumerate(self.histogram):
+            if cnt:
+                desc = OPCODES[byt].desc or "Unknown"
+                opcodes[desc] = opcodes.get(desc, 0) + cnt
+
+        return {
+            "records": self.n_records,
+            "opcodes": dict(sorted(opcodes.items(), key=lambda kv: -kv[1])),
+            "bytes": {hex(byt): cnt for byt, cnt in enumerate(self.histogram) if cnt},
+            "channels": {
+                f"{hex(ptr_offset)}+{hex(ptr)}": stats
+                for (ptr_offset, ptr), stats in self.channels.items()
+            },
+            "jumps": sum(stats["jumps"] for stats in self.channels.values()),
+            "cache_hits": sum(stats["cached"] for stats in self.channels.values()),
+            "seconds": sum(stats["seconds"] for stats in self.channels.values()),
+        }
+
 
 class PokemonRBYParser:
-    def __init__(self, rom: bytes):
+    def __init__(
+        self,
+        rom: Union[bytes, memoryview],
+        cache: Optional[ScoreCache] = None,
+        trace: Optional["ParserTrace"] = None,
+    ):
         """
         Class for parsing Pokemon RBY roms.
 
-        :param rom: Rom
+        :param rom: Rom contents, e.g. bytes or a memoryview of a mapped rom file
+        :param cache: Optional persistent cache of parsed scores
+        :param trace: Optional trace recording every executed opcode
         """
         self.rom = rom
+        self.cache = cache
+        self.trace = trace
+        self._rom_hash = None
 
-    def parse_from_pointer(self, ptr: int, ptr_offset: int) -> Score:
+        # Control-flow graph of decoded basic blocks, keyed by start address
+        self._blocks: Dict[int, BasicBlock] = {}
+        # Resolved notes of blocks, keyed by (start address, octave, speed)
+        self._resolved = {}
+        # Structured subroutines, keyed by (start address, octave, speed)
+        self._subroutines = {}
+
+    @property
+    def rom_hash(self) -> str:
+        """
+        Return content hash of rom.
+        """
+        if self._rom_hash is None:
+            self._rom_hash = hash_rom(self.rom)
+        return self._rom_hash
+
+    def parse_from_pointer(
+        self, ptr: int, ptr_offset: int, structured: bool = False
+    ) -> Score:
         """
         Start parsing music from indicated pointer.
 
         :param ptr: Start pointer
         :param ptr_offset: Bank-specific pointer offset
+        :param structured: Whether to parse into structured form, see parse_structure
         """
-        score = Score()
+        parse = self.parse_structure if structured else self._parse_from_pointer
+        if self.cache is None:
+            return parse(ptr, ptr_offset)
 
-        c_ptr = ptr_offset + ptr
-        ret_ptr = None
-        skip_next = 0
-        octave_exp = None
-        speed_multiplier = 1
-        followed_ptrs = set()
+        key = f"{self.rom_hash}-{ptr_offset:x}-{ptr:x}-v{PARSER_VERSION}"
+        if structured:
+            key += "-s"
+        score = self.cache.get(key)
+        if score is None:
+            score = parse(ptr, ptr_offset)
+            self.cache.put(key, score)
+        elif self.trace is not None and not structured:
+            self.trace.record_cache_hit(ptr, ptr_offset, score.get_expanded_len())
+        return score
+
+    def get_block(self, addr: int) -> BasicBlock:
+        """
+        Return basic block starting at absolute rom address.
+
+        Blocks are decoded once per rom and shared between all channels and tracks
+        that reach them.
+
+        :param addr: Absolute rom address
+        """
+        block = self._blocks.get(addr)
+        if block is None:
+            block = self._blocks[addr] = self._decode_block(addr)
+        return block
 
+    def _decode_block(self, addr: int) -> BasicBlock:
+        rom = self.rom
+        opcodes = OPCODES
+        debug = _logger.isEnabledFor(logging.DEBUG)
+
+        ops = []
+        addrs = []
+        skipped = []
+        c_ptr = addr
         while True:
-            byt = self.rom[c_ptr]
-            prev_c_ptr = c_ptr  # for debugging
+            byt = rom[c_ptr]
+            op = opcodes[byt]
+            kind = op.kind
+            if debug:
+                _logger.debug("%s\t%s %s", hex(c_ptr), op.desc, hex(byt))
             c_ptr += 1
-            cmd = byt >> 4  # upper 4 bits
-            arg = byt % 2**4  # lower 4 bits
-
-            if skip_next > 0:
-                # Skip line (ignored argument)
-                skip_next -= 1
-                debug_msg = "Skip"
-            elif byt == 0xDC:
-                # Velocity?
-                skip_next = 1
-                speed_multiplier = 1  # for 0xd? in next byte
-                debug_msg = "Velocity"
-            elif byt == 0xEC:
-                # Instrument selection 0xec 0x??
-                skip_next = 1
-                debug_msg = "Instrument"
-            elif byt in [0xF8]:
-                # Not sure what this is
-                skip_next = 0
-                debug_msg = "Unknown skip 0"
-            elif byt in [0xD4, 0xDD, 0xEE, 0xF0, 0xFC]:
-                # Not sure what this is
-                skip_next = 1
-                debug_msg = "Unknown skip 1"
-            elif byt in [0xED, 0xEA]:
-                # Not sure what this is
-                skip_next = 2
-                debug_msg = "Unknown skip 2"
-            elif byt in [0xEB]:
-                # Not sure what this is
-                skip_next = 3
-                debug_msg = "Unknown skip 3"
-            elif byt == 0xD6:
-                # Play at 2x speed
-                skip_next = 1
-                speed_multiplier = 2
-                debug_msg = "Speed x2"
-            elif byt == 0xD8:
-                # Play at 1.5x speed
-                skip_next = 1
-                speed_multiplier = 1.5
-                debug_msg = "Speed x1.5"
-            elif byt == 0xFE:
-                # Jump once to pointer in byte 3 and 4 if byte 2 > 0
-                if self.rom[c_ptr] and c_ptr not in followed_ptrs:
-                    followed_ptrs.add(c_ptr)
-                    ret_ptr = c_ptr + 3
-                    c_ptr = (
-                        ptr_offset + (self.rom[c_ptr + 2] << 8) + self.rom[c_ptr + 1]
-                    )
-                elif ret_ptr is not None:
-                    c_ptr = ret_ptr
-                    ret_ptr = None
+
+            if kind <= OP_OCTAVE:
+                ops.append(op)
+                addrs.append(c_ptr - 1)
+            elif kind == OP_SKIP:
+                # Skip ignored arguments
+                skipped.append((c_ptr - 1, bytes(rom[c_ptr - 1 : c_ptr + op.n_args])))
+                c_ptr += op.n_args
+            elif kind == OP_SPEED:
+                ops.append(op)
+                addrs.append(c_ptr - 1)
+                c_ptr += op.n_args
+            elif kind <= OP_END:
+                if kind == OP_LOOP:
+                    count = rom[c_ptr]
+                    target = (rom[c_ptr + 2] << 8) + rom[c_ptr + 1]
+                elif kind == OP_CALL:
+                    count = 0
+                    target = (rom[c_ptr + 1] << 8) + rom[c_ptr]
                 else:
-                    _logger.info("Encountered end %s", hex(byt))
-                    break
-                debug_msg = f"Jump to {hex(c_ptr)} (3 bytes)"
-            elif byt == 0xFD:
-                # Jump to pointer in byte 2 and 3
-                ret_ptr = c_ptr + 2
-                c_ptr = ptr_offset + (self.rom[c_ptr + 1] << 8) + self.rom[c_ptr]
-                debug_msg = f"Jump to {hex(c_ptr)} (2 bytes)"
-            elif byt == 0xFF:
-                # End
-                if ret_ptr is not None:
-                    c_ptr = ret_ptr
+                    count = 0
+                    target = None
+                return BasicBlock(
+                    addr,
+                    tuple(ops),
+                    tuple(addrs),
+                    op,
+                    c_ptr,
+                    count,
+                    target,
+                    tuple(skipped),
+                )
+            else:
+                skipped.append((c_ptr - 1, bytes((byt,))))
+                _logger.warning("Encountered unknown byte %#x", byt)
+
+    def _resolve_block(
+        self, block: BasicBlock, octave: Optional[int], speed: IntFloat
+    ) -> Tuple[Tuple[Note, ...], Optional[int], IntFloat]:
+        """
+        Return notes of block for given entry state and the state at block exit.
+
+        :param block: Basic block
+        :param octave: Octave when entering block
+        :param speed: Speed multiplier when entering block
+        """
+        key = (block.start, octave, speed)
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            return resolved
+
+        make_note = Note._from_trusted
+        durs = DURATIONS[speed]
+        notes = []
+        for op in block.ops:
+            kind = op.kind
+            if kind == OP_NOTE:
+                if octave is None:
+                    raise ValueError(f"Note without octave in block {hex(block.start)}")
+                notes.append(make_note(op.value, octave, durs[op.arg]))
+            elif kind == OP_REST:
+                notes.append(make_note("r", None, durs[op.arg]))
+            elif kind == OP_OCTAVE:
+                octave = op.value
+            else:
+                speed = op.value
+                durs = DURATIONS[speed]
+
+        resolved = self._resolved[key] = (tuple(notes), octave, speed)
+        return resolved
+
+    def iter_events(
+        self, ptr: int, ptr_offset: int, controls: bool = True
+    ) -> Iterator[Union[Note, ControlEvent]]:
+        """
+        Lazily yield notes, rests and control events in rom order.
+
+        :param ptr: Start pointer
+        :param ptr_offset: Bank-specific pointer offset
+        :param controls: Whether to yield control events or only notes and rests
+        """
+        trace = self.trace
+        if trace is not None:
+            trace.begin_channel(ptr, ptr_offset)
+
+        addr = ptr_offset + ptr
+        ret_ptr = None
+        octave = None
+        speed = 1
+        followed_ptrs = set()
+        complete = False
+
+        try:
+            while True:
+                block = self.get_block(addr)
+                if controls:
+                    yield from self._iter_block_events(block, octave, speed)
+                block_notes, octave, speed = self._resolve_block(block, octave, speed)
+                if not controls:
+                    yield from block_notes
+
+                # Pointer to arguments of exit opcode
+                c_ptr = block.exit_ptr
+                kind = block.exit.kind
+                if kind == OP_LOOP:
+                    if block.count and c_ptr not in followed_ptrs:
+                        followed_ptrs.add(c_ptr)
+                        ret_ptr = c_ptr + 3
+                        addr = ptr_offset + block.target
+                    elif ret_ptr is not None:
+                        addr = ret_ptr
+                        ret_ptr = None
+                    else:
+                        addr = None
+                    event = "loop"
+                elif kind == OP_CALL:
+                    ret_ptr = c_ptr + 2
+                    addr = ptr_offset + block.target
+                    event = "call"
+                elif ret_ptr is not None:
+                    addr = ret_ptr
                     ret_ptr = None
-                    debug_msg = f"Returning to {hex(c_ptr)} from subroutine"
+                    event = "return"
                 else:
-                    _logger.info("Encountered end %s", hex(byt))
-                    break
-            elif cmd < 0xC:
-                # Note
-                score.append(
-                    Note(
-                        note=NOTES[cmd % 12],
-                        octave=octave_exp,
-                        dur=(1 + arg) / speed_multiplier,
-                    )
-                )
-                debug_msg = f"Note {NOTES[cmd % 12]}"
-            elif cmd == 0xC:
-                # Rest
-                score.append(
-                    Note(
-                        note="r",
-                        octave=None,
-                        dur=(1 + arg) / speed_multiplier,
-                    )
-                )
-                debug_msg = "Rest"
-            elif cmd == 0xE:
-                # Octave modifier
-                octave_exp = 8 - arg
-                debug_msg = "Octave"
+                    addr = None
+
+                if trace is not None:
+                    trace.record_block(self.rom, block, addr)
+
+                if addr is None:
+                    _logger.info("Encountered end %#x", self.rom[c_ptr - 1])
+                    complete = True
+                    if controls:
+                        yield ControlEvent("end", c_ptr - 1)
+                    return
+
+                _logger.debug("%#x: %s to %#x", c_ptr - 1, event, addr)
+                if controls:
+                    yield ControlEvent(event, c_ptr - 1, addr)
+        finally:
+            # Also when the channel raised or the consumer stopped early
+            if trace is not None:
+                trace.end_channel(complete)
+
+    def _iter_block_events(
+        self, block: BasicBlock, octave: Optional[int], speed: IntFloat
+    ) -> Iterator[Union[Note, ControlEvent]]:
+        block_notes, _, _ = self._resolve_block(block, octave, speed)
+        block_notes = iter(block_notes)
+        for op, addr in zip(block.ops, block.addrs):
+            kind = op.kind
+            if kind <= OP_REST:
+                yield next(block_notes)
+            elif kind == OP_OCTAVE:
+                yield ControlEvent("octave", addr, op.value)
             else:
-                _logger.warning("Encountered unknown byte %s", hex(byt))
-                debug_msg = ""
-                continue
+                yield ControlEvent("speed", addr, op.value)
 
-            _logger.debug("%s\t%s %s", hex(prev_c_ptr), debug_msg, hex(byt))
-        _logger.info(
-            "Obtained score with total duration %f", sum(note.dur for note in score)
-        )
+    def _parse_from_pointer(self, ptr: int, ptr_offset: int) -> Score:
+        score = Score(list(self.iter_events(ptr, ptr_offset, controls=False)))
+        if _logger.isEnabledFor(logging.INFO):
+            _logger.info("Obtained score with total duration %f", score.get_total_dur())
 
         return score
 
-    def get_scores(self, music_desc: dict) -> ScoresType:
+    def parse_structure(self, ptr: int, ptr_offset: int) -> Score:
+        """
+        Parse music from indicated pointer into a structured score.
+
+        Unlike the flat parse, loops are not unrolled: subroutines become shared
+        sequences, counted loops become repeats with the count from the rom and the
+        final infinite loop marks the part of the score that loops forever. Memory
+        therefore scales with the size of the music data, not the playback length.
+        Loop bodies that change octave or speed are resolved per pass instead, in
+        which case one iteration of the infinite loop may span several passes.
+
+        :param ptr: Start pointer
+        :param ptr_offset: Bank-specific pointer offset
+        """
+        items, loop_idx, _, _ = self._build_sequence(
+            ptr_offset + ptr, ptr_offset, None, 1, set()
+        )
+        if loop_idx is None:
+            return Score(intro=Sequence(items))
+        return Score(intro=Sequence(items[:loop_idx]), loop=Sequence(items[loop_idx:]))
+
+    def _get_subroutine(
+        self,
+        addr: int,
+        ptr_offset: int,
+        octave: Optional[int],
+        speed: IntFloat,
+        active: Set[int],
+    ) -> Tuple[Sequence, Optional[int], IntFloat]:
+        key = (addr, octave, speed)
+        subroutine = self._subroutines.get(key)
+        if subroutine is None:
+            items, loop_idx, octave, speed = self._build_sequence(
+                addr, ptr_offset, octave, speed, active
+            )
+            if loop_idx is not None:
+                _logger.warning("Ignoring infinite loop in subroutine %s", hex(addr))
+            subroutine = self._subroutines[key] = (Sequence(items), octave, speed)
+        return subroutine
+
+    def _build_sequence(
+        self,
+        addr: int,
+        ptr_offset: int,
+        octave: Optional[int],
+        speed: IntFloat,
+        active: Set[int],
+        stop: Optional[int] = None,
+    ) -> Tuple[list, Optional[int], Optional[int], IntFloat]:
+        """
+        Build items of routine starting at addr until its end.
+
+        Returns the items, the index of the infinite loop target (if any) and the
+        octave and speed at the end of the routine.
+
+        A loop body is only shared between passes if it ends in the octave and speed
+        it started with. Otherwise every pass is resolved under its own entry state:
+        counted loops are unrolled and the infinite loop covers the passes until the
+        entry state recurs.
+
+        :param addr: Absolute address of routine
+        :param ptr_offset: Bank-specific pointer offset
+        :param octave: Octave when entering routine
+        :param speed: Speed multiplier when entering routine
+        :param active: Addresses of routines currently being built
+        :param stop: Absolute address of a loop opcode to stop at instead of
+            executing it, used to build single passes of a loop body
+        """
+        active = active | {addr}
+
+        items = []
+        # Addresses of opcodes in this routine (ascending), corresponding item index
+        # and (octave, speed) state before every opcode
+        addrs = []
+        idxs = []
+        states = []
+
+        while True:
+            block = self.get_block(addr)
+            block_notes, exit_octave, exit_speed = self._resolve_block(
+                block, octave, speed
+            )
+            block_notes = iter(block_notes)
+            for op, op_addr in zip(block.ops, block.addrs):
+                addrs.append(op_addr)
+                idxs.append(len(items))
+                states.append((octave, speed))
+                if op.kind <= OP_REST:
+                    items.append(next(block_notes))
+                elif op.kind == OP_OCTAVE:
+                    octave = op.value
+                else:
+                    speed = op.value
+            octave, speed = exit_octave, exit_speed
+
+            c_ptr = block.exit_ptr
+            kind = block.exit.kind
+            if c_ptr - 1 == stop:
+                return items, None, octave, speed
+            addrs.append(c_ptr - 1)
+            idxs.append(len(items))
+            states.append((octave, speed))
+
+            if kind == OP_CALL:
+                target = ptr_offset + block.target
+                if target in active:
+                    _logger.warning("Ignoring recursive call to %s", hex(target))
+                else:
+                    subroutine, octave, speed = self._get_subroutine(
+                        target, ptr_offset, octave, speed, active
+                    )
+                    items.append(subroutine)
+                addr = c_ptr + 2
+            elif kind == OP_LOOP:
+                target = ptr_offset + block.target
+                i = bisect_left(addrs, target)
+                found = target <= c_ptr - 1 and i < len(addrs)
+                if not found:
+                    _logger.warning("Cannot resolve loop to %s", hex(target))
+                if block.count == 0:
+                    if not found:
+                        return items, None, octave, speed
+                    idx = idxs[i]
+                    # Entry state of every pass and index of its first item
+                    entries = {states[i]: idx}
+                    while (octave, speed) not in entries:
+                        entries[(octave, speed)] = len(items)
+                        body, _, octave, speed = self._build_sequence(
+                            target, ptr_offset, octave, speed, active, c_ptr - 1
+                        )
+                        items.extend(body)
+                    return items, entries[(octave, speed)], octave, speed
+                if found and block.count > 1:
+                    idx = idxs[i]
+                    if (octave, speed) == states[i]:
+                        body = Sequence(items[idx:])
+                        del items[idx:]
+                        items.append(Repeat(body, block.count))
+                    else:
+                        for _ in range(block.count - 1):
+                            body, _, octave, speed = self._build_sequence(
+                                target, ptr_offset, octave, speed, active, c_ptr - 1
+                            )
+                            items.extend(body)
+                    # Opcodes within the loop all map to its first item
+                    for j in range(i, len(idxs)):
+                        idxs[j] = idx
+                addr = c_ptr + 3
+            else:
+                return items, None, octave, speed
+
+    def get_scores(self, music_desc: dict, structured: bool = False) -> ScoresType:
         """
         Parse scores.
 
         :param music_desc: Music descriptor, part of pointers file
+        :param structured: Whether to parse into structured form
         """
         return [
-            self.parse_from_pointer(ptr=ptr, ptr_offset=music_desc["ptr_offset"])
+            self.parse_from_pointer(
+                ptr=ptr, ptr_offset=music_desc["ptr_offset"], structured=structured
+            )
             for ptr in music_desc["channels"]
         ]
@@ -1,64 +1,460 @@
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from threading import Lock
+from typing import Iterator, List, Optional, Union
 
 import numpy as np
 import scipy.signal
-import simpleaudio
 
-from .const import NOTE_FREQS, NOTES
+from .apu import APU_WAVEFORMS, get_wavetable
+from .arrays import ScoreArray
+from .cache import NoteCache
 from .types import Score, ScoresType
+from .utils import TICKS_PER_BEAT, to_ticks
+
+# Waveforms computed directly from the phase in cycles, equal to the scipy/numpy
+# function of the same name evaluated at 2 * pi * phase
+_PHASE_WAVEFORMS = {
+    "sawtooth": lambda phase: 2 * phase - 1,
+    "square": lambda phase: np.where(phase < 0.5, 1, -1).astype(np.float32),
+    "sin": lambda phase: np.sin(2 * np.pi * phase),
+}
+
+
+# Number of samples rendered at once by Player.render
+RENDER_BLOCK_SIZE = 2**16
+
+
+def _play_buffer(w: np.ndarray, fs: int):
+    # Imported on first use, rendering does not need an audio device
+    import simpleaudio
+
+    return simpleaudio.play_buffer(w, 1, 2, fs)
+
+
+def to_int16(w: np.ndarray) -> np.ndarray:
+    """
+    Convert float wave to int16, clipping samples out of range.
+
+    :param w: Wave array
+    """
+    info = np.iinfo(np.int16)
+    return np.clip(w, info.min, info.max).astype(np.int16)
+
+
+def _iter_batches(
+    score: Union[Score, ScoreArray], loops: int = 1, batch_size: int = 1024
+) -> Iterator[ScoreArray]:
+    if isinstance(score, ScoreArray):
+        for i in range(0, len(score), batch_size):
+            yield score[i : i + batch_size]
+        return
+    notes = score.iter_notes(loops=loops)
+    while True:
+        batch = list(islice(notes, batch_size))
+        if not batch:
+            return
+        yield ScoreArray.from_score(Score(batch))
+
+
+class _Synth:
+    def __init__(self, waveform: str, wave_ram: Optional[List[int]] = None):
+        """
+        Waveform of one channel as function of the phase.
+
+        Game Boy waveforms are looked up in precomputed wavetables, other waveforms
+        are evaluated from the phase, using a scipy.signal or numpy function of the
+        same name unless a direct formula is known.
+
+        :param waveform: Name of waveform
+        :param wave_ram: Samples of the wave channel
+        """
+        self.waveform = waveform
+        self.key = (waveform, tuple(wave_ram) if wave_ram is not None else None)
+        self.wavetable = None
+        self.wavefn = None
+        self.phasefn = None
+        if waveform in APU_WAVEFORMS:
+            self.wavetable = get_wavetable(waveform, wave_ram)
+        elif hasattr(scipy.signal, waveform):
+            self.wavefn = getattr(scipy.signal, waveform)
+        else:
+            self.wavefn = getattr(np, waveform)
+        if self.wavefn is not None:
+            self.phasefn = _PHASE_WAVEFORMS.get(waveform)
+
+    @property
+    def rate(self) -> float:
+        """
+        Return cycles of the waveform per cycle of a note.
+        """
+        return self.wavetable.rate if self.wavetable is not None else 1.0
+
+    def __call__(
+        self, phase: np.ndarray, inc: np.ndarray, lengths: np.ndarray
+    ) -> np.ndarray:
+        """
+        Return float32 samples of consecutive notes.
+
+        :param phase: Phase of every sample in cycles, within [0, 1)
+        :param inc: Cycles per sample of every note
+        :param lengths: Number of samples of every note
+        """
+        if self.wavetable is not None:
+            return self.wavetable.lookup(phase, inc, lengths)
+        phase = phase.astype(np.float32)
+        if self.phasefn is not None:
+            return self.phasefn(phase)
+        return self.wavefn(2 * np.pi * phase).astype(np.float32)
+
+
+class _Voice:
+    def __init__(
+        self,
+        batches: Iterator[ScoreArray],
+        samples_per_tick: float,
+        octave_offset: int,
+        fs: int,
+        synth: _Synth,
+        volume: float,
+        cache: Optional[NoteCache] = None,
+    ):
+        """
+        Sample layout of the pending notes of one channel, read batch by batch.
+
+        :param batches: Batches of notes
+        :param samples_per_tick: Number of samples per tick
+        :param octave_offset: Overall octave offset
+        :param fs: Sampling rate
+        :param synth: Waveform of the channel
+        :param volume: Sound volume (amplitude multiplier)
+        :param cache: Cache of rendered notes, phase is continuous if None
+        """
+        self.batches = batches
+        self.samples_per_tick = samples_per_tick
+        self.octave_offset = octave_offset
+        self.fs = fs
+        self.synth = synth
+        self.volume = volume
+        self.cache = cache
+
+        self.ticks = 0  # ticks of all notes read so far
+        self.phase = 0.0  # phase after all notes read so far in cycles
+        self.end = 0  # end of all notes read so far in samples
+        self.exhausted = False
+
+        # First and last sample, phase increment per sample and start phase per note
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.ends = np.zeros(0, dtype=np.int64)
+        self.inc = np.zeros(0, dtype=np.float64)
+        self.phase0 = np.zeros(0, dtype=np.float64)
+
+    def fill(self, n_samples: Union[int, float]) -> None:
+        """
+        Read notes until the first n_samples samples are covered or the score ends.
+
+        :param n_samples: Number of samples
+        """
+        while self.end < n_samples and not self.exhausted:
+            batch = next(self.batches, None)
+            if batch is None:
+                self.exhausted = True
+                return
+            if len(batch) == 0:
+                continue
+
+            ticks = self.ticks + np.cumsum(batch.ticks)
+            ends = np.rint(ticks * self.samples_per_tick).astype(np.int64)
+            starts = np.concatenate(([self.end], ends[:-1]))
+            inc = batch.get_freqs(self.octave_offset) * (self.synth.rate / self.fs)
+            phase = self.phase + np.cumsum((ends - starts) * inc)
+
+            self.starts = np.concatenate((self.starts, starts))
+            self.ends = np.concatenate((self.ends, ends))
+            self.inc = np.concatenate((self.inc, inc))
+            self.phase0 = np.concatenate(
+                (self.phase0, np.concatenate(([self.phase], phase[:-1])) % 1.0)
+            )
+            self.ticks = int(ticks[-1])
+            self.phase = float(phase[-1]) % 1.0
+            self.end = int(ends[-1])
+
+    def drop(self, n_samples: int) -> None:
+        """
+        Forget notes ending within the first n_samples samples.
+
+        :param n_samples: Number of samples
+        """
+        i = np.searchsorted(self.ends, n_samples, side="right")
+        self.starts = self.starts[i:]
+        self.ends = self.ends[i:]
+        self.inc = self.inc[i:]
+        self.phase0 = self.phase0[i:]
+
+    def render(
+        self,
+        start: int,
+        stop: int,
+        n_cut: int,
+    ) -> np.ndarray:
+        """
+        Render samples from start to stop as float32 wave scaled by volume.
+
+        Samples after the end of the score are silent.
+
+        :param start: First sample
+        :param stop: Sample after the last one
+        :param n_cut: Number of silent samples at the end of every note
+        """
+        if self.cache is not None:
+            return self._render_cached(start, stop, n_cut)
+
+        w = np.zeros(stop - start, dtype=np.float32)
+        i = np.searchsorted(self.ends, start, side="right")
+        j = np.searchsorted(self.starts, stop, side="left")
+        starts = self.starts[i:j]
+        ends = self.ends[i:j]
+        inc = self.inc[i:j]
+        lengths = np.minimum(ends, stop) - np.maximum(starts, start)
+        n = int(lengths.sum())
+
+        # Phase of every sample, linear within every note
+        phase = np.arange(n, dtype=np.float64)
+        phase *= np.repeat(inc, lengths)
+        phase += np.repeat(self.phase0[i:j] + (start - starts) * inc, lengths)
+        phase %= 1.0
+        w[:n] = self.synth(phase, inc, lengths)
+        w *= self.volume
+
+        # Silence rests and the cut at the end of every note
+        silent_from = np.where(inc > 0, ends - n_cut, starts)
+        silent_from = np.maximum(silent_from, np.maximum(starts, start)) - start
+        for a, b in zip(
+            silent_from.tolist(), (np.minimum(ends, stop) - start).tolist()
+        ):
+            w[a:b] = 0
+        return w
+
+    def _get_note(self, inc: float, length: int, n_cut: int) -> np.ndarray:
+        key = (
+            inc * self.fs / self.synth.rate,
+            length,
+            self.synth.key,
+            self.volume,
+            n_cut,
+            self.fs,
+        )
+        w = self.cache.get(key)
+        if w is None:
+            phase = np.arange(length, dtype=np.float64)
+            phase *= inc
+            phase %= 1.0
+            w = self.synth(phase, np.array([inc]), np.array([length]))
+            w = w.astype(np.float32, copy=False) * self.volume
+            w[max(length - n_cut, 0) :] = 0
+            self.cache.put(key, w)
+        return w
+
+    def _render_cached(self, start: int, stop: int, n_cut: int) -> np.ndarray:
+        w = np.zeros(stop - start, dtype=np.float32)
+        i = np.searchsorted(self.ends, start, side="right")
+        j = np.searchsorted(self.starts, stop, side="left")
+        for a, b, inc in zip(
+            self.starts[i:j].tolist(), self.ends[i:j].tolist(), self.inc[i:j].tolist()
+        ):
+            if inc == 0 or a == b:
+                continue
+            note = self._get_note(inc, b - a, n_cut)
+            offset = max(a, start)
+            w[offset - start : min(b, stop) - start] = note[offset - a : stop - a]
+        return w
 
 
 class Player:
-    def __init__(self, fs: int, volume: float = 2**12, waveform: str = "sawtooth"):
+    def __init__(
+        self,
+        fs: int,
+        volume: float = 2**12,
+        waveform: Union[str, List[str]] = "sawtooth",
+        wave_ram: Optional[List[int]] = None,
+        note_cache: Optional[NoteCache] = None,
+    ):
         """
         Class for playing parsed scores.
 
+        Besides scipy.signal and numpy functions, the waveform can be one of the
+        Game Boy waveforms in APU_WAVEFORMS. With a list of waveforms, channel i of
+        the scores uses waveform i, cycling through the list, e.g. GB_WAVEFORMS for
+        the pulse, pulse, wave and noise channels of the Game Boy.
+
+        With a note cache, every note starts at phase 0 instead of continuing the
+        phase of the previous note, so repeated notes are copied from the cache.
+        The phase reset falls into the silent cut at the end of the previous note.
+
         :param fs: Sampling rate
         :param volume: Sound volume (amplitude multiplier)
-        :param waveform: Waveform function to use
+        :param waveform: Waveform function to use, or one per channel
+        :param wave_ram: 32 4-bit samples of the wave channel
+        :param note_cache: Cache of rendered notes, disabled if None
         """
         self.fs = fs
         self.volume = volume
-        if hasattr(scipy.signal, waveform):
-            self.wavefn = getattr(scipy.signal, waveform)
-        else:
-            self.wavefn = getattr(np, waveform)
+        self.waveforms = [waveform] if isinstance(waveform, str) else list(waveform)
+        if not self.waveforms:
+            raise ValueError("No waveform given")
+        self.synths = [_Synth(w, wave_ram) for w in self.waveforms]
+        self.note_cache = note_cache
 
         self.play_obj = None
 
+    def _make_voice(
+        self,
+        batches: Iterator[ScoreArray],
+        channel: int,
+        octave_offset: int,
+        speed: float,
+    ) -> _Voice:
+        return _Voice(
+            batches,
+            self._get_samples_per_tick(speed),
+            octave_offset,
+            self.fs,
+            self.synths[channel % len(self.synths)],
+            self.volume,
+            self.note_cache,
+        )
+
+    def _get_samples_per_tick(self, speed: float) -> float:
+        return speed * self.fs / (16 * TICKS_PER_BEAT)
+
+    def get_n_samples(
+        self, scores: ScoresType, loops: int = 1, speed: float = 2.0
+    ) -> int:
+        """
+        Return number of samples of the mix of scores without rendering them.
+
+        :param scores: Parsed scores or score arrays, one per channel
+        :param loops: Number of loop iterations of structured scores
+        :param speed: Speed multiplier
+        """
+        samples_per_tick = self._get_samples_per_tick(speed)
+        n_samples = 0
+        for score in scores:
+            if isinstance(score, ScoreArray):
+                ticks = score.get_total_ticks()
+            else:
+                ticks = to_ticks(score.get_expanded_dur(loops))
+            n_samples = max(n_samples, int(np.rint(ticks * samples_per_tick)))
+        return n_samples
+
+    def render(
+        self,
+        score: Union[Score, ScoreArray],
+        octave_offset: int = 5,
+        speed: float = 2.0,
+        cut: float = 0.01,
+        channel: int = 0,
+    ) -> np.ndarray:
+        """
+        Render score to float32 wave scaled by volume.
+
+        Note boundaries are computed from exact cumulative ticks. Notes are
+        generated by a phase accumulator, so the phase is continuous across notes.
+        Rests and the cut at the end of every note are silent. Samples are rendered
+        in blocks of RENDER_BLOCK_SIZE into the output, so temporary memory does not
+        grow with the length of the score.
+
+        :param score: Parsed score or score array
+        :param octave_offset: Overall octave offset
+        :param speed: Speed multiplier
+        :param cut: Time of silence between two notes
+        :param channel: Channel index selecting the waveform
+        """
+        voice = self._make_voice(
+            iter([ScoreArray.from_score(score)]), channel, octave_offset, speed
+        )
+        voice.fill(np.inf)
+        n_cut = round(cut * self.fs)
+        w = np.empty(voice.end, dtype=np.float32)
+        for start in range(0, voice.end, RENDER_BLOCK_SIZE):
+            stop = min(start + RENDER_BLOCK_SIZE, voice.end)
+            w[start:stop] = voice.render(start, stop, n_cut)
+        return w
+
+    def iter_blocks(
+        self,
+        scores: ScoresType,
+        block_size: int = 4096,
+        loops: int = 1,
+        octave_offset: int = 5,
+        speed: float = 2.0,
+        cut: float = 0.01,
+        gains: Optional[List[float]] = None,
+    ) -> Iterator[np.ndarray]:
+        """
+        Render scores block by block and yield the mix as float32 blocks.
+
+        Notes are read lazily as blocks are requested, so memory is bounded by the
+        block size and does not grow with the length of the scores or the number of
+        loops. The phase of every channel is continuous across block boundaries and
+        the concatenated blocks equal the sum of the rendered scores. All blocks but
+        the last one have block_size samples.
+
+        :param scores: Parsed scores or score arrays, one per channel
+        :param block_size: Number of samples per block
+        :param loops: Number of loop iterations of structured scores
+        :param octave_offset: Overall octave offset
+        :param speed: Speed multiplier
+        :param cut: Time of silence between two notes
+        :param gains: Gain per channel, defaults to 1 for all channels
+        """
+        if block_size < 1:
+            raise ValueError("Block size must be positive")
+        n_cut = round(cut * self.fs)
+        voices = [
+            self._make_voice(_iter_batches(score, loops), i, octave_offset, speed)
+            for i, score in enumerate(scores)
+        ]
+        if gains is None:
+            gains = [1.0] * len(voices)
+        if len(gains) != len(voices):
+            raise ValueError("Number of gains must match number of scores")
+
+        pos = 0
+        while True:
+            for voice in voices:
+                voice.fill(pos + block_size)
+            stop = min(pos + block_size, max((v.end for v in voices), default=0))
+            if stop <= pos:
+                return
+            block = np.zeros(stop - pos, dtype=np.float32)
+            for voice, gain in zip(voices, gains):
+                w = voice.render(pos, stop, n_cut)
+                if gain != 1:
+                    w *= gain
+                block += w
+                voice.drop(stop)
+            yield block
+            pos = stop
+
     def get_wave(
         self,
-        score: Score,
+        score: Union[Score, ScoreArray],
         octave_offset: int = 5,
         speed: float = 2.0,
         cut: float = 0.01,
+        channel: int = 0,
     ) -> np.array:
         """
         Create wave from parsed score.
 
-        :param score: Parsed score
+        :param score: Parsed score or score array
         :param octave_offset: Overall octave offset
         :param speed: Speed multiplier
         :param cut: Time of silence between two notes
+        :param channel: Channel index selecting the waveform
         """
-        durs = [speed * note.dur / 16 for note in score]
-        total_dur = sum(durs)
-        t = np.linspace(0, total_dur, round(total_dur * self.fs), endpoint=False)
-        w = np.zeros(t.shape)
-
-        a = 0  # start of note
-        b = 0  # end of note
-        for i, (note, octave, _) in enumerate(score):
-            a = b
-            b = round(sum(durs[: i + 1]) * self.fs)
-            b_prime = b - round(cut * self.fs)
-            if note == "r":
-                freq = 0
-            else:
-                freq = 2 ** (octave - octave_offset) * NOTE_FREQS[NOTES.index(note)]
-            w[a:b_prime] = self.volume * self.wavefn(t[a:b_prime] * freq * 2 * np.pi)
-
-        return w.astype(np.int16)
+        return self.render(score, octave_offset, speed, cut, channel).astype(np.int16)
 
     def get_waves(self, scores: ScoresType, *args, **kwargs) -> List[np.array]:
         """
@@ -66,7 +462,10 @@ class Player:
 
         :param score: Parsed score
         """
-        return [self.get_wave(score, *args, **kwargs) for score in scores]
+        return [
+            self.get_wave(score, *args, channel=i, **kwargs)
+            for i, score in enumerate(scores)
+        ]
 
     def play_score(self, score: Score, **kwargs) -> None:
         """
@@ -76,7 +475,7 @@ class Player:
         """
         self.stop()
         w = self.get_wave(score, **kwargs)
-        self.play_obj = simpleaudio.play_buffer(w, 1, 2, self.fs)
+        self.play_obj = _play_buffer(w, self.fs)
 
     def play_wave(self, w: np.array) -> None:
         """
@@ -85,7 +484,7 @@ class Player:
         :param w: Wave array
         """
         self.stop()
-        self.play_obj = simpleaudio.play_buffer(w, 1, 2, self.fs)
+        self.play_obj = _play_buffer(w, self.fs)
 
     def stop(self) -> None:
         """
@@ -100,3 +499,104 @@ class Player:
         """
         if self.play_obj:
             self.play_obj.wait_done()
+
+
+class Mixer:
+    def __init__(
+        self,
+        player: Player,
+        gains: Optional[List[float]] = None,
+        headroom: float = 0.9,
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Class for mixing the channels of parsed scores.
+
+        Channels are rendered concurrently by a thread pool, as the NumPy kernels
+        release the GIL, and accumulated in float32 with a gain per channel. The mix
+        is limited to a ceiling of headroom times full scale: if the channels could
+        exceed it when adding up in phase, all of them are attenuated by the same
+        factor. Samples are converted to int16 once, so they never wrap around.
+
+        :param player: Player used for rendering channels
+        :param gains: Gain per channel, defaults to 1 for all channels
+        :param headroom: Ceiling of the mix as fraction of int16 full scale
+        :param max_workers: Number of rendering threads, defaults to number of cpus
+        """
+        if not 0 < headroom <= 1:
+            raise ValueError("Headroom must be in (0, 1]")
+        self.player = player
+        self.gains = gains
+        self.headroom = headroom
+        self.max_workers = max_workers
+
+    def get_gains(self, n_channels: int) -> List[float]:
+        """
+        Return gain per channel including attenuation to stay below the ceiling.
+
+        :param n_channels: Number of channels
+        """
+        gains = self.gains if self.gains is not None else [1.0] * n_channels
+        if len(gains) != n_channels:
+            raise ValueError("Number of gains must match number of scores")
+        ceiling = self.headroom * np.iinfo(np.int16).max
+        peak = self.player.volume * sum(abs(g) for g in gains)
+        if peak > ceiling:
+            return [g * ceiling / peak for g in gains]
+        return list(gains)
+
+    def mix(
+        self,
+        scores: ScoresType,
+        octave_offset: int = 5,
+        speed: float = 2.0,
+        cut: float = 0.01,
+    ) -> np.ndarray:
+        """
+        Render and mix scores to float32 wave within the ceiling.
+
+        Channels of different lengths are mixed from the beginning, the mix is as
+        long as the longest channel.
+
+        :param scores: Parsed scores or score arrays, one per channel
+        :param octave_offset: Overall octave offset
+        :param speed: Speed multiplier
+        :param cut: Time of silence between two notes
+        """
+        arrays = [ScoreArray.from_score(score) for score in scores]
+        gains = self.get_gains(len(arrays))
+        n_samples = self.player.get_n_samples(arrays, speed=speed)
+        out = np.zeros(n_samples, dtype=np.float32)
+        lock = Lock()
+
+        def render(channel: int, arr: ScoreArray, gain: float) -> None:
+            w = self.player.render(arr, octave_offset, speed, cut, channel)
+            w *= gain
+            with lock:
+                out[: len(w)] += w
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for future in [
+                executor.submit(render, i, arr, gain)
+                for i, (arr, gain) in enumerate(zip(arrays, gains))
+            ]:
+                future.result()
+        return out
+
+    def get_wave(self, scores: ScoresType, **kwargs) -> np.ndarray:
+        """
+        Render and mix scores to int16 wave.
+
+        :param scores: Parsed scores or score arrays, one per channel
+        """
+        return to_int16(self.mix(scores, **kwargs))
+
+    def iter_blocks(self, scores: ScoresType, **kwargs) -> Iterator[np.ndarray]:
+        """
+        Render and mix scores block by block, see Player.iter_blocks.
+
+        :param scores: Parsed scores or score arrays, one per channel
+        """
+        return self.player.iter_blocks(
+            scores, gains=self.get_gains(len(scores)), **kwargs
+        )
@@ -1,59 +1,308 @@
+import inspect
 import logging
-import math
-from copy import copy, deepcopy
-from typing import Dict, List, Tuple, Union
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
-from .const import NOTES
+import numpy as np
+
+from .arrays import CHORD, REST, ScoreArray, as_score
+from .cache import ProcessingCache
+from .const import NOTE_INDEX, NOTES
+from .selection import Selector, SelectorType, select
 from .types import Note, Score, ScoresType
-from .utils import align_duration, is_close_to_round, parse_index, round_if_close
+from .utils import TICKS_PER_BEAT, to_ticks
 
 _logger = logging.getLogger(__name__)
 
+# Bump whenever an op changes its results to invalidate cached results
+PROCESSING_VERSION = 2
+
+
+class OpSpec(NamedTuple):
+    fun: Callable[..., Union[Score, Tuple[Score, ...]]]
+    pure: bool = True  # does not modify its input score
+    preserves_len: bool = False  # output has as many notes as input
+    preserves_dur: bool = False  # output has same total duration as input
+    n_outputs: int = 1  # number of returned scores
+    # Combines the arguments of two successive calls, None if not fusable
+    fuse: Optional[Callable[[Dict, Dict], Optional[Dict]]] = None
+    # Whether the op does nothing with the given arguments
+    is_identity: Optional[Callable[[Dict], bool]] = None
+    # Equivalent implementation on score arrays
+    array_fun: Optional[Callable[..., Union[ScoreArray, Tuple[ScoreArray, ...]]]] = None
+
 
-def apply_processing(scores: ScoresType, sheets_config: Dict) -> ScoresType:
+# Registry of ops available in the processing section of sheets configs
+OPS: Dict[str, OpSpec] = {}
+
+
+def register_op(**properties) -> Callable:
     """
-    Apply processing configuration to scores.
+    Register function as processing op.
 
-    :param scores: Scores to process
-    :param sheets_config: Sheets config with processing info
+    :param properties: Properties of op, see OpSpec
+    """
+
+    def decorator(fun):
+        OPS[fun.__name__] = OpSpec(fun, **properties)
+        return fun
+
+    return decorator
+
+
+def register_array_op(name: str) -> Callable:
     """
-    scores = copy(scores)
+    Register function as array implementation of processing op.
+
+    :param name: Name of registered op
+    """
+
+    def decorator(fun):
+        OPS[name] = OPS[name]._replace(array_fun=fun)
+        return fun
+
+    return decorator
+
+
+# Processing backends, "numpy" uses array implementations where available
+BACKENDS = ("python", "numpy")
+
+
+class ProcessingStep(NamedTuple):
+    name: str
+    spec: OpSpec
+    args: Dict[str, Any]
+
+
+class ProcessingPlan:
+    def __init__(
+        self,
+        steps: Dict[int, List[ProcessingStep]],
+        chords: Optional[Tuple[str, int, int, Dict[str, Any]]] = None,
+        backend: str = "python",
+    ):
+        """
+        Plan of processing steps, validated and compiled by compile_processing.
+
+        :param steps: Processing steps by channel
+        :param chords: Chords op name, channels and arguments
+        :param backend: Processing backend
+        """
+        self.steps = steps
+        self.chords = chords
+        self.backend = backend
+
+    def _run_step(
+        self,
+        name: str,
+        spec: OpSpec,
+        args: Dict[str, Any],
+        score: Union[Score, ScoreArray],
+        check: bool,
+    ) -> Union[Score, ScoreArray, Tuple[Union[Score, ScoreArray], ...]]:
+        if self.backend == "numpy" and spec.array_fun is not None:
+            score = ScoreArray.from_score(score)
+            result = spec.array_fun(score, **args)
+        else:
+            score = as_score(score)
+            # Impure ops get a copy-on-write copy, so shared scores stay intact
+            result = spec.fun(score if spec.pure else score.copy(), **args)
+        if check:
+            _check_step(name, spec, score, result)
+        return result
+
+    def run(
+        self,
+        scores: ScoresType,
+        check: bool = False,
+        cache: Optional[ProcessingCache] = None,
+    ) -> ScoresType:
+        """
+        Apply plan to scores.
+
+        With a cache, the result of every step is looked up by the key of its input
+        and its arguments before running it, so only steps after a changed step are
+        recomputed.
+
+        :param scores: Scores or score arrays to process
+        :param check: Whether to verify declared op properties after every step
+        :param cache: Cache of intermediate results
+        """
+        scores = list(scores)
+        keys: List[Optional[str]] = [None] * len(scores)
+
+        def get_key(i: int) -> str:
+            if keys[i] is None:
+                keys[i] = cache.hash_score(scores[i])
+            return keys[i]
 
-    if "processing" in sheets_config:
         for i in range(len(scores)):
-            if i not in sheets_config["processing"]:
+            for name, spec, args in self.steps.get(i, ()):
+                if cache is None:
+                    result = self._run_step(name, spec, args, scores[i], check)
+                else:
+                    key = cache.make_key(
+                        get_key(i), f"{name}/v{PROCESSING_VERSION}", args
+                    )
+                    result = cache.get(key)
+                    if result is None:
+                        result = self._run_step(name, spec, args, scores[i], check)
+                        cache.put(key, result)
+
+                # Unpack scores if multiple where returned
+                if spec.n_outputs > 1:
+                    scores.extend(result[1:])
+                    if cache is None:
+                        keys.extend([None] * (len(result) - 1))
+                    else:
+                        keys.extend(f"{key}/{j}" for j in range(1, len(result)))
+                        key = f"{key}/0"
+                    result = result[0]
+                scores[i] = result
+                if cache is not None:
+                    keys[i] = key
+
+        scores = [as_score(score) for score in scores]
+
+        if self.chords is not None:
+            typ, ia, ib, kwargs = self.chords
+            if cache is None:
+                result = CHORD_OPS[typ](scores[ia], scores[ib], **kwargs)
+            else:
+                key = cache.make_key(
+                    f"{get_key(ia)}+{get_key(ib)}",
+                    f"{typ}/v{PROCESSING_VERSION}",
+                    kwargs,
+                )
+                result = cache.get(key)
+                if result is None:
+                    result = CHORD_OPS[typ](scores[ia], scores[ib], **kwargs)
+                    cache.put(key, result)
+            scores.append(result)
+
+        if cache is not None:
+            _logger.debug("Processing cache: %s", cache.stats())
+
+        return scores
+
+    def __repr__(self):
+        return (
+            f"ProcessingPlan(steps={self.steps!r}, chords={self.chords!r}, "
+            f"backend={self.backend!r})"
+        )
+
+
+def _check_step(
+    name: str, spec: OpSpec, score: Score, result: Union[Score, Tuple[Score, ...]]
+) -> None:
+    results = result if spec.n_outputs > 1 else (result,)
+    if len(results) != spec.n_outputs:
+        raise ValueError(f"Op {name!r} returned {len(results)} scores")
+    if spec.preserves_len and len(results[0]) != len(score):
+        raise ValueError(f"Op {name!r} changed number of notes")
+    if spec.preserves_dur:
+        for res in results:
+            if res.get_total_ticks() != score.get_total_ticks():
+                raise ValueError(
+                    f"Expected durations to match but got {score.get_total_dur()} "
+                    f"and {res.get_total_dur()}"
+                )
+
+
+def _fuse_steps(steps: List[ProcessingStep]) -> List[ProcessingStep]:
+    fused = []
+    for step in steps:
+        if fused and fused[-1].name == step.name and step.spec.fuse is not None:
+            args = step.spec.fuse(fused[-1].args, step.args)
+            if args is not None:
+                fused[-1] = step._replace(args=args)
                 continue
+        fused.append(step)
+    return [
+        step
+        for step in fused
+        if step.spec.is_identity is None or not step.spec.is_identity(step.args)
+    ]
 
-            for op in sheets_config["processing"][i]:
-                if isinstance(op, str):
-                    op = [op, {}]
-                fun, args = op
-                scores[i] = globals()[fun](scores[i], **args)
 
-                # Unpack scores if multiple where returned
-                if isinstance(scores[i], Tuple):
-                    for score in scores[i][1:]:
-                        scores.append(score)
-                    scores[i] = scores[i][0]
+def compile_processing(sheets_config: Dict, backend: str = "python") -> ProcessingPlan:
+    """
+    Validate processing configuration and compile it to a plan.
 
+    Successive fusable ops are combined, ops without effect are dropped and index
+    specs are compiled to selectors.
+
+    :param sheets_config: Sheets config with processing info
+    :param backend: Processing backend, one of BACKENDS
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown processing backend {backend!r}")
+
+    # Bars in selectors are counted like on the staff
+    staff_args = sheets_config.get("staff_args", {})
+    bar_length = staff_args.get("bar_length", 16)
+    anacrusis = staff_args.get("anacrusis", 0)
+
+    steps = {}
+    for i, ops in sheets_config.get("processing", {}).items():
+        channel_steps = []
+        for op in ops:
+            if isinstance(op, str):
+                op = [op, {}]
+            fun, args = op
+            if fun not in OPS:
+                raise ValueError(f"Unknown processing op {fun!r}")
+            spec = OPS[fun]
+            try:
+                inspect.signature(spec.fun).bind(None, **args)
+            except TypeError as e:
+                raise ValueError(f"Invalid arguments for op {fun!r}: {e}") from e
+            args = dict(args)
+            if "index" in args and not isinstance(args["index"], Selector):
+                args["index"] = Selector(args["index"], bar_length, anacrusis)
+            channel_steps.append(ProcessingStep(fun, spec, args))
+        steps[i] = _fuse_steps(channel_steps)
+
+    chords = None
     if "chords" in sheets_config:
         ia, ib = sheets_config["chords"]["channels"]
-        scorea, scoreb = scores[ia], scores[ib]
         kwargs = sheets_config["chords"].get("kwargs", {})
 
         typ = sheets_config["chords"].get("type", "make_chords")
-        if typ == "make_chords":
-            scores.append(make_chords(scorea, scoreb, **kwargs))
-        elif typ == "align_shortest":
-            scores.append(align_shortest(scorea, scoreb, **kwargs))
-        elif typ == "part_combine":
-            scores.append(fuzzy_part_combine(scorea, scoreb, **kwargs))
-        else:
+        if typ not in CHORD_OPS:
             raise ValueError(f"Unknown chords type {typ!r}")
+        chords = (typ, ia, ib, dict(kwargs))
 
-    return scores
+    return ProcessingPlan(steps, chords, backend)
 
 
+def apply_processing(
+    scores: ScoresType,
+    sheets_config: Union[Dict, ProcessingPlan],
+    backend: str = "python",
+    cache: Optional[ProcessingCache] = None,
+    check: bool = False,
+) -> ScoresType:
+    """
+    Apply processing configuration to scores.
+
+    :param scores: Scores or score arrays to process
+    :param sheets_config: Sheets config with processing info or compiled plan
+    :param backend: Processing backend if sheets_config is not compiled yet
+    :param cache: Cache of intermediate results
+    :param check: Whether to verify declared op properties after every step
+    """
+    if not isinstance(sheets_config, ProcessingPlan):
+        sheets_config = compile_processing(sheets_config, backend)
+    return sheets_config.run(scores, check=check, cache=cache)
+
+
+@register_op(
+    preserves_len=True,
+    preserves_dur=True,
+    fuse=lambda a, b: {"offset": a["offset"] + b["offset"]},
+    is_identity=lambda args: args["offset"] == 0,
+)
 def transpose_score_octave(score: Score, offset: int) -> Score:
     """
     Transpose a score by the specified octave offset.
@@ -64,9 +313,8 @@ def transpose_score_octave(score: Score, offset: int) -> Score:
     return Score([note.with_octave_offset(offset) for note in score])
 
 
-def transpose_note_octave(
-    score: Score, offset: int, index: Union[int, str, List[Union[int, str]]]
-) -> Score:
+@register_op(preserves_len=True, preserves_dur=True)
+def transpose_note_octave(score: Score, offset: int, index: SelectorType) -> Score:
     """
     Transpose note(s) at index/indices in a score by the specified octave offset.
 
@@ -74,19 +322,15 @@ def transpose_note_octave(
     :param offset: Octave offset
     :param index: Note index/indices
     """
-    index = parse_index(index, len(score))
+    mask = select(score, index).tolist()
 
     return Score(
-        [
-            note.with_octave_offset(offset) if i in index else copy(note)
-            for i, note in enumerate(score)
-        ]
+        [note.with_octave_offset(offset) if m else note for m, note in zip(mask, score)]
     )
 
 
-def transpose_note(
-    score: Score, offset: int, index: Union[int, str, List[Union[int, str]]]
-) -> Score:
+@register_op(preserves_len=True, preserves_dur=True)
+def transpose_note(score: Score, offset: int, index: SelectorType) -> Score:
     """
     Transpose note(s) at index/indices in a score by the specified semitone offset.
 
@@ -94,99 +338,81 @@ def transpose_note(
     :param offset: Semitone offset
     :param index: Note index/indices
     """
-    index = parse_index(index, len(score))
+    mask = select(score, index).tolist()
 
     return Score(
         [
-            note.with_semitone_offset(offset) if i in index else copy(note)
-            for i, note in enumerate(score)
+            note.with_semitone_offset(offset) if m else note
+            for m, note in zip(mask, score)
         ]
     )
 
 
-def remove_note(score: Score, index: Union[int, str, List[Union[int, str]]]) -> Score:
+@register_op(preserves_len=True, preserves_dur=True)
+def remove_note(score: Score, index: SelectorType) -> Score:
     """
     Remove note(s) at index/indices.
 
     :param score: Score to process
     :param index: Note index/indices
     """
-    index = parse_index(index, len(score))
+    mask = select(score, index).tolist()
 
     return Score(
         [
-            Note("r", None, note.dur) if i in index else copy(note)
-            for i, note in enumerate(score)
+            Note._from_trusted("r", None, note.ticks) if m else note
+            for m, note in zip(mask, score)
         ]
     )
 
 
+@register_op(preserves_dur=True)
 def combine_rests(score: Score) -> Score:
     """
     Combine successive rests to a single rest.
 
     :param score: Score to process
     """
+    new_notes = [score[0]]
 
-    def check_total_durs(scorea: Score, scoreb: Score) -> None:
-        dura = scorea.get_total_dur()
-        durb = scoreb.get_total_dur()
-
-        if not math.isclose(dura, durb):
-            raise ValueError(f"Expected durations to match but got {dura} and {durb}")
-
-    score = deepcopy(score)
-    new_score = Score([score[0]])
-
-    for note in score[1:]:
-        if new_score[-1].note == "r" and note.note == "r":
-            combined_dur = new_score[-1].dur + note.dur
-            new_score[-1] = new_score[-1].from_dur(combined_dur)
+    for note in islice(score, 1, None):
+        if new_notes[-1].note == "r" and note.note == "r":
+            new_notes[-1] = new_notes[-1].from_ticks(new_notes[-1].ticks + note.ticks)
             continue
-        new_score.append(note)
-
-    check_total_durs(new_score, score)
-
-    for note in new_score:
-        if note.note == "r":
-            note.dur = round_if_close(note.dur)
+        new_notes.append(note)
 
-    check_total_durs(new_score, score)
-
-    return new_score
+    return Score(new_notes)
 
 
+@register_op(preserves_dur=True)
 def combine_irregular_notes(score: Score) -> Score:
     """
     Combine successive irregular-duration notes of same pitch.
 
     :param score: Score to process
     """
-    score = deepcopy(score)
     new_score = Score([score[0]])
 
-    for note in score[1:]:
+    for note in islice(score, 1, None):
         if (
             new_score[-1].note != note.note
             or new_score[-1].octave != note.octave
-            or (new_score[-1].dur * 2).is_integer()
-            or (note.dur * 2).is_integer()
+            or new_score[-1].ticks % (TICKS_PER_BEAT // 2) == 0
+            or note.ticks % (TICKS_PER_BEAT // 2) == 0
         ):
             new_score.append(note)
             continue
 
-        combined_dur = new_score[-1].dur + note.dur
-        if is_close_to_round(combined_dur, 1):
-            combined_dur = round(combined_dur, 1)
-            new_score[-1] = new_score[-1].from_dur(combined_dur)
+        combined_ticks = new_score[-1].ticks + note.ticks
+        if combined_ticks % (TICKS_PER_BEAT // 10) == 0:
+            new_score[-1] = new_score[-1].from_ticks(combined_ticks)
         else:
             new_score.append(note)
 
-    assert math.isclose(new_score.get_total_dur(), score.get_total_dur())
-
     return new_score
 
 
+@register_op(preserves_dur=True)
 def eat_rests(score: Score, max_dur: float = 0.5) -> Score:
     """
     Remove short rests and add duration to preceeding note instead.
@@ -194,23 +420,22 @@ def eat_rests(score: Score, max_dur: float = 0.5) -> Score:
     :param score: Score to process
     :param max_dur: Maxiumum duration of rests to remove
     """
-    score = deepcopy(score)
     new_score = Score()
+    max_ticks = to_ticks(max_dur)
 
     for note in score:
-        if note.note == "r" and note.dur <= max_dur:
-            combined_dur = new_score[-1].dur + note.dur
-            if combined_dur.is_integer():
-                new_score[-1] = new_score[-1].from_dur(combined_dur)
+        if note.note == "r" and note.ticks <= max_ticks:
+            combined_ticks = new_score[-1].ticks + note.ticks
+            if combined_ticks % TICKS_PER_BEAT == 0:
+                new_score[-1] = new_score[-1].from_ticks(combined_ticks)
                 continue
 
         new_score.append(note)
 
-    assert math.isclose(new_score.get_total_dur(), score.get_total_dur())
-
     return new_score
 
 
+@register_op(preserves_len=True, preserves_dur=True)
 def transpose_score_below(score: Score, t_note: str, t_octave: int):
     """
     Transpose all notes in score below threshold in octaves until above threshold.
@@ -232,27 +457,26 @@ def transpose_score_below(score: Score, t_note: str, t_octave: int):
     return new_score
 
 
-def split_notes(
-    score: Score, index: Union[int, str, List[Union[int, str]]]
-) -> Tuple[Score, Score]:
+@register_op(preserves_dur=True, n_outputs=2)
+def split_notes(score: Score, index: SelectorType) -> Tuple[Score, Score]:
     """
     Remove note(s) at index/indices from score and add to new score.
 
     :param score: Score to process
     :param index: Index/indices to remove
     """
-    index = parse_index(index, len(score))
+    mask = select(score, index).tolist()
 
     scorea = Score(
         [
-            note if i not in index else Note("r", None, note.dur)
-            for i, note in enumerate(score)
+            Note._from_trusted("r", None, note.ticks) if m else note
+            for m, note in zip(mask, score)
         ]
     )
     scoreb = Score(
         [
-            note if i in index else Note("r", None, note.dur)
-            for i, note in enumerate(score)
+            note if m else Note._from_trusted("r", None, note.ticks)
+            for m, note in zip(mask, score)
         ]
     )
 
@@ -273,15 +497,15 @@ def make_chords(scorea: Score, scoreb: Score, allow_seconds: bool = True) -> Sco
     new_score = Score()
 
     assert len(scorea) == len(scoreb)
-    assert scorea.get_total_dur() == scoreb.get_total_dur()
+    assert scorea.get_total_ticks() == scoreb.get_total_ticks()
 
     for na, nb in zip(scorea, scoreb):
-        assert na.dur == nb.dur
+        assert na.ticks == nb.ticks
 
         if na.note == "r":
-            new_score.append(copy(nb))
+            new_score.append(nb)
         elif nb.note == "r":
-            new_score.append(copy(na))
+            new_score.append(na)
         else:
             not_second = (
                 abs(
@@ -292,11 +516,11 @@ def make_chords(scorea: Score, scoreb: Score, allow_seconds: bool = True) -> Sco
             )
 
             if na.note == nb.note and na.octave == nb.octave:
-                new_score.append(copy(na))
+                new_score.append(na)
             elif allow_seconds or not_second:
                 new_score.append(Note.from_notes(na, nb))
             else:
-                new_score.append(copy(na))
+                new_score.append(na)
 
     return combine_rests(new_score)
 
@@ -311,28 +535,25 @@ def align_shortest(scorea: Score, scoreb: Score, **kwargs) -> Score:
     :param scorea: First score
     :param scoreb: Second score
     """
-    strike_durs = set([0])
+    strike_ticks = set([0])
     for score in [scorea, scoreb]:
-        current_dur = 0
-        for note in score:
-            if note.note != "r":
-                strike_durs.add(current_dur)
-            current_dur = align_duration(current_dur + note.dur)
-        strike_durs.add(score.get_total_dur())
+        onsets = score.onsets
+        strike_ticks.update(t for t, note in zip(onsets, score) if note.note != "r")
+        strike_ticks.add(onsets[-1])
 
-    strike_durs = sorted(strike_durs)
+    strike_ticks = sorted(strike_ticks)
 
     new_scores = []
     for score in [scorea, scoreb]:
         new_score = Score()
 
-        for dur_from, dur_to in zip(strike_durs[:-1], strike_durs[1:]):
-            idx, dur = score.idx_at_dur(dur_from)
-            if math.isclose(dur, dur_from) and idx < len(score):
+        for ticks_from, ticks_to in zip(strike_ticks[:-1], strike_ticks[1:]):
+            idx, ticks = score.idx_at_ticks(ticks_from)
+            if ticks == ticks_from and idx < len(score):
                 # Note starts playing at current duration
-                new_score.append(score[idx].from_dur(dur_to - dur_from))
+                new_score.append(score[idx].from_ticks(ticks_to - ticks_from))
             else:
-                new_score.append(Note("r", None, dur_to - dur_from))
+                new_score.append(Note._from_trusted("r", None, ticks_to - ticks_from))
 
         new_scores.append(new_score)
 
@@ -348,17 +569,159 @@ def fuzzy_part_combine(scorea: Score, scoreb: Score, errors: str = "ignore") ->
     """
     assert errors in ("ignore", "raise")
 
-    scorea = deepcopy(scorea)
-    current_dur = 0
+    scorea = scorea.copy()
+    current_ticks = 0
 
     for note in scoreb:
         if note.note != "r":
-            idx, dur = scorea.idx_at_dur(current_dur)
-            if dur == current_dur:
+            idx, ticks = scorea.idx_at_ticks(current_ticks)
+            if ticks == current_ticks:
                 scorea[idx] = Note.from_notes(scorea[idx], note, dur=scorea[idx].dur)
             elif errors == "raise":
                 _logger.error("Durations do not match")
 
-        current_dur += note.dur
+        current_ticks += note.ticks
 
     return scorea
+
+
+def _offset_pitches(
+    score: ScoreArray, offset: int, mask: Optional[np.ndarray] = None
+) -> ScoreArray:
+    sel = score.pitch > CHORD
+    if mask is not None:
+        sel &= mask
+    pitch = np.where(sel, score.pitch + offset, score.pitch).astype(np.int16)
+    chords = {
+        i: tuple(p + offset for p in c) if mask is None or mask[i] else c
+        for i, c in score.chords.items()
+    }
+    return ScoreArray(pitch, score.ticks, chords)
+
+
+@register_array_op("transpose_score_octave")
+def transpose_score_octave_array(score: ScoreArray, offset: int) -> ScoreArray:
+    """
+    Transpose a score array by the specified octave offset.
+
+    :param score: Score array to transpose
+    :param offset: Octave offset
+    """
+    return _offset_pitches(score, 12 * offset)
+
+
+@register_array_op("transpose_note_octave")
+def transpose_note_octave_array(
+    score: ScoreArray, offset: int, index: SelectorType
+) -> ScoreArray:
+    """
+    Transpose note(s) at index/indices in a score array by the octave offset.
+
+    :param score: Score array to transpose
+    :param offset: Octave offset
+    :param index: Note index/indices
+    """
+    return _offset_pitches(score, 12 * offset, select(score, index))
+
+
+@register_array_op("transpose_note")
+def transpose_note_array(
+    score: ScoreArray, offset: int, index: SelectorType
+) -> ScoreArray:
+    """
+    Transpose note(s) at index/indices in a score array by the semitone offset.
+
+    :param score: Score array to transpose
+    :param offset: Semitone offset
+    :param index: Note index/indices
+    """
+    mask = select(score, index)
+    if np.any(mask & score.is_rest):
+        raise ValueError("Cannot apply semitone offset to rest")
+    return _offset_pitches(score, offset, mask)
+
+
+def _remove_masked(score: ScoreArray, mask: np.ndarray) -> ScoreArray:
+    pitch = np.where(mask, np.int16(REST), score.pitch)
+    chords = {i: c for i, c in score.chords.items() if not mask[i]}
+    return ScoreArray(pitch, score.ticks, chords)
+
+
+@register_array_op("remove_note")
+def remove_note_array(score: ScoreArray, index: SelectorType) -> ScoreArray:
+    """
+    Remove note(s) at index/indices of a score array.
+
+    :param score: Score array to process
+    :param index: Note index/indices
+    """
+    return _remove_masked(score, select(score, index))
+
+
+@register_array_op("combine_rests")
+def combine_rests_array(score: ScoreArray) -> ScoreArray:
+    """
+    Combine successive rests of a score array to a single rest.
+
+    :param score: Score array to process
+    """
+    if len(score) == 0:
+        raise IndexError("Cannot combine rests of empty score")
+
+    is_rest = score.is_rest
+    keep = np.ones(len(score), dtype=bool)
+    keep[1:] = ~(is_rest[1:] & is_rest[:-1])
+
+    new_idx = np.cumsum(keep) - 1
+    ticks = np.add.reduceat(score.ticks, np.flatnonzero(keep))
+    chords = {int(new_idx[i]): c for i, c in score.chords.items()}
+    return ScoreArray(score.pitch[keep], ticks, chords)
+
+
+@register_array_op("transpose_score_below")
+def transpose_score_below_array(
+    score: ScoreArray, t_note: str, t_octave: int
+) -> ScoreArray:
+    """
+    Transpose all notes in score array below threshold in octaves until above it.
+
+    Notes are transposed by at most t_octave - 1 octaves.
+
+    :param score: Score array to process
+    :param t_note: Note threshold
+    :param t_octave: Octave threshold
+    """
+    if np.any(score.pitch <= CHORD):
+        raise TypeError("Cannot compare rests or chords with threshold")
+    if t_octave < 1 and len(score) > 0:
+        raise ValueError("Octave threshold must be positive")
+
+    threshold = 12 * (t_octave + 1) + NOTE_INDEX[t_note]
+    pitch = score.pitch.astype(np.int64)
+    # Smallest number of octaves that brings pitch to or above threshold
+    octaves = np.clip(-((pitch - threshold) // 12), 0, t_octave - 1)
+    return ScoreArray((pitch + 12 * octaves).astype(np.int16), score.ticks)
+
+
+@register_array_op("split_notes")
+def split_notes_array(
+    score: ScoreArray, index: SelectorType
+) -> Tuple[ScoreArray, ScoreArray]:
+    """
+    Remove note(s) at index/indices from score array and add to new score array.
+
+    :param score: Score array to process
+    :param index: Index/indices to remove
+    """
+    mask = select(score, index)
+    scorea = combine_rests_array(_remove_masked(score, mask))
+    scoreb = combine_rests_array(_remove_masked(score, ~mask))
+    return scorea, scoreb
+
+
+# Ops available in the chords section of sheets configs
+CHORD_OPS: Dict[str, Callable[..., Score]] = {
+    "make_chords": make_chords,
+    "align_shortest": align_shortest,
+    "part_combine": fuzzy_part_combine,
+}
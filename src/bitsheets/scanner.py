@@ -0,0 +1,195 @@
+import logging
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import yaml
+
+from .parser import PokemonRBYParser
+from .types import Note
+
+_logger = logging.getLogger(__name__)
+_parser_logger = logging.getLogger(PokemonRBYParser.__module__)
+
+BANK_SIZE = 0x4000
+
+
+class MusicHeader(NamedTuple):
+    addr: int  # absolute address of header
+    ptr_offset: int  # bank-specific pointer offset
+    channels: List[int]  # pointers of melodic channels
+    percussion: Optional[int] = None  # pointer of noise channel
+
+
+def find_music_headers(rom: Union[bytes, memoryview]) -> List[MusicHeader]:
+    """
+    Find candidate music headers in rom.
+
+    A music header consists of 3 bytes per channel: the channel id (with the channel
+    count in the upper two bits of the first entry) and a little-endian pointer into
+    the switchable bank, i.e., 0x4000-0x7fff. Music channels use the ids 0 to 3,
+    while sound effects use higher ids.
+
+    :param rom: Rom contents
+    """
+    data = np.frombuffer(rom, dtype=np.uint8)
+    headers = []
+
+    for n_channels in (2, 3, 4):
+        span = 3 * n_channels
+        m = len(data) - span + 1
+        if m <= 0:
+            continue
+
+        mask = data[:m] == ((n_channels - 1) << 6)
+        for c in range(n_channels):
+            if c > 0:
+                mask &= data[3 * c : 3 * c + m] == c
+            # High byte of pointer must lie in switchable bank
+            mask &= (data[3 * c + 2 : 3 * c + 2 + m] & 0xC0) == 0x40
+
+        for addr in np.flatnonzero(mask).tolist():
+            bank = addr // BANK_SIZE
+            if bank == 0:
+                continue
+            ptr_offset = (bank - 1) * BANK_SIZE
+            ptrs = [
+                int(data[addr + 3 * c + 1]) + (int(data[addr + 3 * c + 2]) << 8)
+                for c in range(n_channels)
+            ]
+            headers.append(
+                MusicHeader(
+                    addr,
+                    ptr_offset,
+                    ptrs[:3],
+                    ptrs[3] if n_channels == 4 else None,
+                )
+            )
+
+    return sorted(headers)
+
+
+@contextmanager
+def _quiet_parser():
+    # Candidates are mostly garbage, so warnings on their contents are expected
+    level = _parser_logger.level
+    _parser_logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        _parser_logger.setLevel(level)
+
+
+def validate_header(
+    parser: PokemonRBYParser, header: MusicHeader, max_events: int = 2**14
+) -> bool:
+    """
+    Check whether all melodic channels of header decode to a finite score.
+
+    Parser warnings and info messages are suppressed while decoding.
+
+    :param parser: Parser for the rom
+    :param header: Candidate header
+    :param max_events: Maximum number of events per channel
+    """
+    for ptr in header.channels:
+        n_notes = 0
+        n_events = 0
+        try:
+            with _quiet_parser():
+                events = parser.iter_events(ptr, header.ptr_offset)
+                for event in islice(events, max_events + 1):
+                    n_events += 1
+                    n_notes += isinstance(event, Note)
+        except (IndexError, KeyError, ValueError):
+            return False
+        if n_events > max_events or n_notes == 0:
+            return False
+    return True
+
+
+def _match_known(
+    header: MusicHeader,
+    known: List[Tuple[int, Tuple[int, ...], str, Optional[str]]],
+    taken: Dict[str, dict],
+) -> Tuple[Optional[str], Optional[str]]:
+    # Prefer a config with exactly the channels of the header, then the config
+    # covering most of them, as configs may omit channels
+    channels = set(header.channels)
+    best = (None, None)
+    best_overlap = 0
+    for ptr_offset, known_channels, name, title in known:
+        if ptr_offset != header.ptr_offset or name in taken:
+            continue
+        if known_channels == tuple(header.channels):
+            return name, title
+        if channels.issuperset(known_channels) and len(known_channels) > best_overlap:
+            best = (name, title)
+            best_overlap = len(known_channels)
+    return best
+
+
+def scan_pointer_config(
+    rom: Union[bytes, memoryview], music_ptrs: Optional[Dict[str, dict]] = None
+) -> Dict[str, dict]:
+    """
+    Find all music tracks in rom and return pointer config.
+
+    :param rom: Rom contents
+    :param music_ptrs: Existing pointer config to take track names and titles from
+    """
+    known = [
+        (desc["ptr_offset"], tuple(desc["channels"]), name, desc.get("title"))
+        for name, desc in (music_ptrs or {}).items()
+    ]
+
+    parser = PokemonRBYParser(rom)
+    config = {}
+    for header in find_music_headers(rom):
+        if not validate_header(parser, header):
+            _logger.debug("Rejected header candidate at %s", hex(header.addr))
+            continue
+
+        bank = header.addr // BANK_SIZE
+        name, title = _match_known(header, known, config)
+        if name is None:
+            name = f"bank{bank:02x}_{header.addr % BANK_SIZE + BANK_SIZE:04x}"
+        desc = config[name] = {}
+        if title is not None:
+            desc["title"] = title
+        desc["channels"] = header.channels
+        if header.percussion is not None:
+            desc["percussion"] = header.percussion
+        desc["ptr_offset"] = header.ptr_offset
+
+    _logger.info("Found %d music tracks", len(config))
+    return config
+
+
+class _HexDumper(yaml.SafeDumper):
+    pass
+
+
+# Pointers are written in hexadecimal, like in the rom map
+_HexDumper.add_representer(
+    int, lambda dumper, x: dumper.represent_scalar("tag:yaml.org,2002:int", hex(x))
+)
+
+
+def dump_pointer_config(config: Dict[str, dict], pth: str) -> None:
+    """
+    Dump pointer config to YAML file with hexadecimal pointers.
+
+    :param config: Pointer config
+    :param pth: Output path
+    """
+    with open(pth, "w") as f:
+        yaml.dump(
+            config,
+            f,
+            Dumper=_HexDumper,
+            allow_unicode=True,
+            sort_keys=False,
+            default_flow_style=False,
+        )
@@ -0,0 +1,171 @@
+import re
+from typing import List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from .arrays import ScoreArray
+from .types import Score
+from .utils import to_ticks
+
+_RANGE_RE = re.compile(r"^\s*(-?\d+)?\s*>\s*(-?\d+)?\s*(?::\s*(\d+))?\s*$")
+_TIME_RE = re.compile(
+    r"^\s*(bars?|beats?)\s+(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?))?\s*$"
+)
+
+
+class _IndexRange(NamedTuple):
+    start: Optional[int]  # first index, None for beginning of score
+    stop: Optional[int]  # last index (inclusive), None for end of score
+    step: int = 1
+
+
+class _TimeRange(NamedTuple):
+    start: int  # ticks, inclusive
+    stop: int  # ticks, exclusive
+
+
+class Selector:
+    def __init__(
+        self,
+        index: Union[int, str, List[Union[int, str]]],
+        bar_length: int = 16,
+        anacrusis: int = 0,
+    ):
+        """
+        Select notes of a score by an index spec, compiled once.
+
+        An index spec is a single term or a list of terms, each one of:
+
+        - an index, negative indices count from the end
+        - an inclusive range "a>b", either end may be omitted, with an optional step
+          as in "a>b:2"
+        - bars "bars 4-8" (inclusive, counting from 1) or "bar 4"
+        - beats "beats 8-16" (half-open, counting from 0) or "beat 8"
+
+        Bar and beat terms select notes by their onset. With an anacrusis, bar 1
+        starts after the pickup.
+
+        :param index: Index spec
+        :param bar_length: Length of a bar in beats
+        :param anacrusis: Anacrusis/pickup in beats
+        """
+        self.index = index
+        self.bar_length = bar_length
+        self.anacrusis = anacrusis
+        self.terms = [
+            self._compile_term(term)
+            for term in (index if isinstance(index, list) else [index])
+        ]
+
+    def _compile_term(
+        self, term: Union[int, str]
+    ) -> Union[int, _IndexRange, _TimeRange]:
+        if isinstance(term, int):
+            return term
+        if not isinstance(term, str):
+            raise ValueError(f"Invalid index {term!r}")
+
+        m = _RANGE_RE.match(term)
+        if m is not None:
+            start, stop, step = m.groups()
+            step = int(step) if step is not None else 1
+            if step < 1:
+                raise ValueError(f"Invalid step in index {term!r}")
+            return _IndexRange(
+                int(start) if start is not None else None,
+                int(stop) if stop is not None else None,
+                step,
+            )
+
+        m = _TIME_RE.match(term)
+        if m is not None:
+            unit, start, stop = m.groups()
+            start = float(start)
+            stop = float(stop) if stop is not None else start
+            if unit.startswith("bar"):
+                if start < 1 or stop < start:
+                    raise ValueError(f"Invalid bars in index {term!r}")
+                offset = self.anacrusis - self.bar_length
+                return _TimeRange(
+                    to_ticks(offset + start * self.bar_length),
+                    to_ticks(offset + (stop + 1) * self.bar_length),
+                )
+            if stop == start:
+                # Single beat
+                stop = start + 1
+            if stop < start:
+                raise ValueError(f"Invalid beats in index {term!r}")
+            return _TimeRange(to_ticks(start), to_ticks(stop))
+
+        raise ValueError(f"Invalid index {term!r}")
+
+    @property
+    def is_time_based(self) -> bool:
+        """
+        Return whether selection depends on note onsets.
+        """
+        return any(isinstance(term, _TimeRange) for term in self.terms)
+
+    def get_mask(self, n: int, onsets: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Return boolean mask of selected notes.
+
+        :param n: Number of notes
+        :param onsets: Onset of every note in ticks, needed for bar and beat terms
+        """
+        mask = np.zeros(n, dtype=bool)
+        for term in self.terms:
+            if isinstance(term, int):
+                i = term + n if term < 0 else term
+                if 0 <= i < n:
+                    mask[i] = True
+            elif isinstance(term, _IndexRange):
+                start = 0 if term.start is None else term.start
+                stop = n - 1 if term.stop is None else term.stop
+                start = start + n if start < 0 else start
+                stop = stop + n if stop < 0 else stop
+                if start < 0:
+                    # Skip indices before the beginning, keeping the step phase
+                    start += -(start // term.step) * term.step
+                if stop >= start:
+                    mask[start : stop + 1 : term.step] = True
+            else:
+                if onsets is None:
+                    raise ValueError("Bar and beat selection requires note onsets")
+                mask |= (onsets >= term.start) & (onsets < term.stop)
+        return mask
+
+    def select(self, score: Union[Score, ScoreArray]) -> np.ndarray:
+        """
+        Return boolean mask of selected notes of a score.
+
+        :param score: Score or score array
+        """
+        onsets = None
+        if self.is_time_based:
+            if isinstance(score, ScoreArray):
+                onsets = score.onset_ticks
+            else:
+                onsets = np.array(score.onsets[:-1], dtype=np.int64)
+        return self.get_mask(len(score), onsets)
+
+    def __repr__(self):
+        return (
+            f"Selector({self.index!r}, bar_length={self.bar_length!r}, "
+            f"anacrusis={self.anacrusis!r})"
+        )
+
+
+SelectorType = Union[int, str, List[Union[int, str]], Selector]
+
+
+def select(score: Union[Score, ScoreArray], index: SelectorType) -> np.ndarray:
+    """
+    Return boolean mask of notes of a score selected by index spec or selector.
+
+    :param score: Score or score array
+    :param index: Index spec or compiled selector
+    """
+    if not isinstance(index, Selector):
+        index = Selector(index)
+    return index.select(score)
@@ -1,4 +1,36 @@
-from .types import Note, ScoresType
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from .arrays import CHORD, ScoreArray
+from .const import NOTE_INDEX
+from .types import IntFloat, Note, ScoresType
+from .utils import from_ticks, to_ticks
+
+KeyType = Tuple[str, str]
+
+# Krumhansl-Kessler key profiles, starting at the tonic
+MAJOR_PROFILE = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+MINOR_PROFILE = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+
+# Conventional spelling of tonics by pitch class
+_MAJOR_TONICS = ["c", "des", "d", "ees", "e", "f", "fis", "g", "aes", "a", "bes", "b"]
+_MINOR_TONICS = ["c", "cis", "d", "ees", "e", "f", "fis", "g", "gis", "a", "bes", "b"]
+
+# All 24 keys and their profiles, majors first
+KEYS: List[KeyType] = [(t, "major") for t in _MAJOR_TONICS] + [
+    (t, "minor") for t in _MINOR_TONICS
+]
+_PROFILES = np.array(
+    [np.roll(MAJOR_PROFILE, t) for t in range(12)]
+    + [np.roll(MINOR_PROFILE, t) for t in range(12)]
+)
+
+
+class KeySection(NamedTuple):
+    start: float  # beats from beginning of score
+    key: KeyType
+    correlation: float
 
 
 def get_circle_of_fifths(mode: str = "major"):
@@ -45,18 +77,71 @@ def get_natural_minor_scale(tonic: Note):
     return scale
 
 
-def get_most_likely_key(scores: ScoresType):
+def _get_pitch_classes(scores: ScoresType) -> Tuple[np.ndarray, ...]:
     """
-    Get most likely key for scores.
+    Return pitch class, onset and end in ticks of every sounding pitch.
+
+    Chords contribute one entry per pitch.
 
     :param scores: Scores to analyze
     """
-    # Prepare scores
-    notes = []
+    empty = np.zeros(0, dtype=np.int64)
+    pcs, starts, ends, is_chord = [empty], [empty], [empty], [empty.astype(bool)]
     for score in scores:
-        notes.extend([note.note for note in score])
+        score = ScoreArray.from_score(score)
+        onsets = score.onset_ticks
+        single = score.pitch > CHORD
+        pcs.append(score.pitch[single] % 12)
+        starts.append(onsets[single])
+        ends.append(onsets[single] + score.ticks[single])
+        is_chord.append(np.zeros(np.count_nonzero(single), dtype=bool))
+
+        for i, chord in score.chords.items():
+            pcs.append(np.array(chord) % 12)
+            starts.append(np.full(len(chord), onsets[i]))
+            ends.append(np.full(len(chord), onsets[i] + score.ticks[i]))
+            is_chord.append(np.ones(len(chord), dtype=bool))
+
+    return (
+        np.concatenate(pcs).astype(np.int64),
+        np.concatenate(starts).astype(np.int64),
+        np.concatenate(ends).astype(np.int64),
+        np.concatenate(is_chord),
+    )
+
+
+def get_pitch_class_histogram(scores: ScoresType, weighted: bool = True) -> np.ndarray:
+    """
+    Return pitch-class histogram of scores.
+
+    :param scores: Scores to analyze
+    :param weighted: Whether to weight pitches by duration instead of counting them
+    """
+    pcs, starts, ends, _ = _get_pitch_classes(scores)
+    weights = (ends - starts) if weighted else None
+    return np.bincount(pcs, weights=weights, minlength=12).astype(np.float64)
+
+
+def get_key_correlations(hist: np.ndarray) -> np.ndarray:
+    """
+    Return correlation of histogram(s) with the profiles of all keys in KEYS.
+
+    :param hist: Pitch-class histogram, or one histogram per row
+    """
+    h = hist - hist.mean(axis=-1, keepdims=True)
+    p = _PROFILES - _PROFILES.mean(axis=-1, keepdims=True)
+    norm = np.linalg.norm(h, axis=-1, keepdims=True) * np.linalg.norm(p, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = (h @ p.T) / norm
+    return np.nan_to_num(corr)
+
+
+def _get_most_likely_key_by_scale(scores: ScoresType) -> KeyType:
+    # Count single notes in major and natural minor scales of all tonics, with
+    # tonics ordered by closeness to c major and a minor on the circle of fifths
+    pcs, _, _, is_chord = _get_pitch_classes(scores)
+    hist = np.bincount(pcs[~is_chord], minlength=12)
 
-    # Prepare tonics
     def _interleave(l):
         res = [l[0]]
         lenl = len(l)
@@ -70,18 +155,110 @@ def get_most_likely_key(scores: ScoresType):
     minor_cl = _interleave(get_circle_of_fifths("minor"))
 
     tonics = [t for pair in zip(major_cl, minor_cl) for t in pair]
-
-    # Count matches
-    max_matches = 0
-    best_i = 0
+    scales = np.zeros((len(tonics), 12), dtype=bool)
     for i, t in enumerate(tonics):
         scale = get_major_scale(t) if i % 2 == 0 else get_natural_minor_scale(t)
-        scale = [note.note for note in scale]
-        matches = len(list(filter(lambda n: n in scale, notes)))
-        if matches > max_matches:
-            max_matches = matches
-            best_i = i
-            if max_matches == len(notes):
-                break
+        scales[i, [NOTE_INDEX[note.note] for note in scale]] = True
 
+    best_i = int(np.argmax(scales @ hist))
     return tonics[best_i].note, "major" if best_i % 2 == 0 else "minor"
+
+
+def get_most_likely_key(scores: ScoresType, method: str = "scale") -> KeyType:
+    """
+    Get most likely key for scores.
+
+    The scale method counts notes that lie in the scale of each key. The profile
+    method correlates the duration-weighted pitch-class histogram with the
+    Krumhansl-Kessler profiles of all keys, it may detect a different key and
+    spells tonics conventionally, e.g., "ees" instead of "dis".
+
+    :param scores: Scores to analyze
+    :param method: One of "scale", "profile"
+    """
+    if method == "scale":
+        return _get_most_likely_key_by_scale(scores)
+    if method != "profile":
+        raise ValueError("Expected one of 'scale', 'profile' as method")
+
+    corr = get_key_correlations(get_pitch_class_histogram(scores))
+    return KEYS[int(np.argmax(corr))]
+
+
+def _get_cumulative_ticks(
+    starts: np.ndarray, ends: np.ndarray, bounds: np.ndarray
+) -> np.ndarray:
+    """
+    Return total overlap of intervals [start, end) with [0, bound) for every bound.
+
+    :param starts: Interval starts
+    :param ends: Interval ends
+    :param bounds: Bounds
+    """
+
+    def ramp(x):
+        # Sum of max(bound - x, 0) over all x
+        x = np.sort(x)
+        cs = np.concatenate(([0], np.cumsum(x)))
+        k = np.searchsorted(x, bounds, side="left")
+        return k * bounds - cs[k]
+
+    return ramp(starts) - ramp(ends)
+
+
+def get_key_sections(
+    scores: ScoresType,
+    window: IntFloat = 64,
+    anacrusis: IntFloat = 0,
+    margin: float = 0.1,
+) -> List[KeySection]:
+    """
+    Detect keys of successive sections of scores.
+
+    The scores are split into windows, aligned to bars after the anacrusis, and the
+    key of every window is detected with the profile method. The key only changes
+    if the new key correlates better than the current one by more than a margin,
+    windows without notes keep the current key.
+
+    :param scores: Scores to analyze
+    :param window: Length of a window in beats
+    :param anacrusis: Anacrusis/pickup in beats
+    :param margin: Minimum correlation advantage of a new key
+    """
+    pcs, starts, ends, _ = _get_pitch_classes(scores)
+    total = int(ends.max()) if len(ends) else 0
+
+    window = to_ticks(window)
+    first = to_ticks(anacrusis) or window
+    bounds = np.concatenate(([0], np.arange(first, total, window), [total]))
+    bounds = np.unique(bounds)
+
+    cumulative = np.stack(
+        [
+            _get_cumulative_ticks(starts[pcs == pc], ends[pcs == pc], bounds)
+            for pc in range(12)
+        ],
+        axis=-1,
+    )
+    hists = np.diff(cumulative, axis=0).astype(np.float64)
+    corrs = get_key_correlations(hists)
+
+    sections = []
+    current = None
+    for w in range(len(hists)):
+        if not hists[w].any():
+            continue
+        best = int(np.argmax(corrs[w]))
+        if current is None or corrs[w, best] > corrs[w, current] + margin:
+            current = best
+            sections.append([int(bounds[w]) if sections else 0, best, hists[w].copy()])
+        else:
+            sections[-1][2] += hists[w]
+
+    if not sections:
+        return [KeySection(0.0, KEYS[0], 0.0)]
+
+    return [
+        KeySection(from_ticks(start), KEYS[k], float(get_key_correlations(hist)[k]))
+        for start, k, hist in sections
+    ]
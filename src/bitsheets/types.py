@@ -1,16 +1,36 @@
+from bisect import bisect_left, bisect_right
 from functools import total_ordering
-from typing import List, NamedTuple, Optional, Tuple, Union
-
-from .const import NOTES
-from .utils import align_duration
+from itertools import accumulate, chain
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .const import NOTE_INDEX, NOTES
+from .utils import from_ticks, to_ticks
 
 IntFloat = Union[int, float]
 
 
+_VALID_NOTES = frozenset(NOTES) | {"r"}
+
+# Interned notes, keyed by (note, octave, ticks)
+_NOTE_POOL: Dict[Tuple[str, Optional[int], Optional[int]], "Note"] = {}
+_NOTE_POOL_SIZE = 2**14
+
+
 @total_ordering
 class Note:
-    def __init__(
-        self,
+    __slots__ = ("note", "octave", "dur", "ticks")
+
+    def __new__(
+        cls,
         note: Union[str, List[str]],
         octave: Optional[Union[int, List[int]]],
         dur: Optional[IntFloat] = None,
@@ -18,35 +38,72 @@ class Note:
         """
         Class for representing parser note.
 
+        Notes are immutable and hashable, equality only considers pitch. Single-pitch
+        notes are interned, so equal notes share one instance. Durations are stored
+        exactly as integer ticks, dur is the equivalent duration in beats. Pitches of
+        chords are ordered from lowest to highest.
+
         :param note: Pitch of note within octave
         :param octave: Octave
         :param dur: Note duration
         """
+        ticks = to_ticks(dur)
         if isinstance(note, str):
-            assert note in NOTES + ["r"]
+            # Interned notes are already validated
+            self = _NOTE_POOL.get((note, octave, ticks))
+            if self is not None and cls is Note:
+                return self
+
+            assert note in _VALID_NOTES
             assert (note != "r") != (octave is None)
         else:
             for note_i in note:
-                assert note_i in NOTES + ["r"]
+                assert note_i in _VALID_NOTES
 
-            # Remove rests
-            no = [(n, o) for n, o in zip(note, octave) if n != "r"]
+            # Remove rests and duplicate notes, order from lowest to highest pitch
+            no = sorted(
+                {(n, o) for n, o in zip(note, octave) if n != "r"},
+                key=lambda no: (no[1], NOTE_INDEX[no[0]]),
+            )
 
             if len(no) == 0:
                 note = "r"
                 octave = None
             else:
-                # Remove duplicate notes
-                no = list(set(no))
                 note = [n for n, _ in no]
                 octave = [o for _, o in no]
 
-        self.note = note
-        self.octave = octave
-        self.dur = align_duration(dur)
+        return cls._from_trusted(note, octave, ticks)
 
-    def _as_dict(self):
-        return {"note": self.note, "octave": self.octave, "dur": self.dur}
+    @classmethod
+    def _from_trusted(
+        cls,
+        note: Union[str, List[str]],
+        octave: Optional[Union[int, List[int]]],
+        ticks: Optional[int],
+    ) -> "Note":
+        """
+        Create note from already validated values without checks.
+
+        :param note: Pitch of note within octave
+        :param octave: Octave
+        :param ticks: Note duration in ticks
+        """
+        if cls is Note and isinstance(note, str):
+            key = (note, octave, ticks)
+            self = _NOTE_POOL.get(key)
+            if self is not None:
+                return self
+
+        self = object.__new__(cls)
+        _set_note(self, note)
+        _set_octave(self, octave)
+        _set_dur(self, from_ticks(ticks))
+        _set_ticks(self, ticks)
+
+        if cls is Note and isinstance(note, str) and len(_NOTE_POOL) < _NOTE_POOL_SIZE:
+            _NOTE_POOL[key] = self
+        return self
 
     def with_semitone_offset(self, offset: int) -> "Note":
         """
@@ -55,29 +112,19 @@ class Note:
         :param offset: Semitone offset
         """
         if isinstance(self.note, str):
-            new_note_idx = NOTES.index(self.note) + offset
+            if self.note == "r":
+                raise ValueError("Cannot apply semitone offset to rest")
+            new_note_idx = NOTE_INDEX[self.note] + offset
             new_note = NOTES[new_note_idx % 12]
+            new_octave = self.octave + new_note_idx // 12
         elif isinstance(self.note, list):
-            new_note_idx = [NOTES.index(note) + offset for note in self.note]
+            new_note_idx = [NOTE_INDEX[note] + offset for note in self.note]
             new_note = [NOTES[idx % 12] for idx in new_note_idx]
+            new_octave = [o + idx // 12 for o, idx in zip(self.octave, new_note_idx)]
         else:
             raise ValueError("Error occured while processing note")
 
-        octave_offset = new_note_idx // 12
-        if isinstance(self.octave, int):
-            new_octave = self.octave + octave_offset
-        elif isinstance(self.octave, list):
-            new_octave = [octave + octave_offset for octave in self.octave]
-        else:
-            raise ValueError("Error occured while processing note")
-
-        return type(self)(
-            **{
-                **self._as_dict(),
-                "note": new_note,
-                "octave": new_octave,
-            }
-        )
+        return type(self)._from_trusted(new_note, new_octave, self.ticks)
 
     def with_octave_offset(self, offset: int) -> "Note":
         """
@@ -93,7 +140,7 @@ class Note:
             octave = [o + offset for o in self.octave]
         else:
             raise ValueError("Type of octave must be int or List[int]")
-        return type(self)(**{**self._as_dict(), "octave": octave})
+        return type(self)._from_trusted(self.note, octave, self.ticks)
 
     def from_dur(self, dur: IntFloat) -> "Note":
         """
@@ -101,7 +148,15 @@ class Note:
 
         :param dur: New duration
         """
-        return type(self)(**{**self._as_dict(), "dur": dur})
+        return type(self)._from_trusted(self.note, self.octave, to_ticks(dur))
+
+    def from_ticks(self, ticks: int) -> "Note":
+        """
+        Return copy of self with new duration in ticks.
+
+        :param ticks: New duration in ticks
+        """
+        return type(self)._from_trusted(self.note, self.octave, ticks)
 
     @staticmethod
     def from_notes(*notes: List["Note"], dur: Optional[IntFloat] = None) -> "Note":
@@ -121,34 +176,256 @@ class Note:
             dur=dur,
         )
 
+    def __setattr__(self, name, value):
+        raise AttributeError("Note is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Note is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self)._from_trusted, (self.note, self.octave, self.ticks)
+
     def __iter__(self):
         return iter((self.note, self.octave, self.dur))
 
     def __eq__(self, other):
         return self.note == other.note and self.octave == other.octave
 
+    def __hash__(self):
+        if isinstance(self.note, list):
+            return hash((tuple(self.note), tuple(self.octave)))
+        return hash((self.note, self.octave))
+
     def __lt__(self, other):
         if self.octave < other.octave:
             return True
         if self.octave > other.octave:
             return False
         # Octaves are the same
-        return NOTES.index(self.note) < NOTES.index(other.note)
+        return NOTE_INDEX[self.note] < NOTE_INDEX[other.note]
 
     def __repr__(self):
         return f"Note(note={self.note!r}, octave={self.octave!r}, dur={self.dur!r})"
 
 
+# Slot setters bypassing immutability, for construction only
+_set_note = Note.note.__set__
+_set_octave = Note.octave.__set__
+_set_dur = Note.dur.__set__
+_set_ticks = Note.ticks.__set__
+
+
+class Sequence:
+    def __init__(self, items: Iterable[Union[Note, "Sequence", "Repeat"]]):
+        """
+        Immutable sequence of notes and nested structure nodes.
+
+        Sequences can be shared, e.g., between all calls of the same subroutine.
+
+        :param items: Notes, sequences and repeats
+        """
+        self.items = tuple(items)
+        self.n_notes = sum(1 if isinstance(i, Note) else i.n_notes for i in self.items)
+        self.ticks = sum(i.ticks for i in self.items)
+
+    @property
+    def dur(self) -> float:
+        """
+        Return total duration in beats.
+        """
+        return from_ticks(self.ticks)
+
+    def iter_notes(self) -> Iterator[Note]:
+        """
+        Yield all notes in order.
+        """
+        for item in self.items:
+            if isinstance(item, Note):
+                yield item
+            else:
+                yield from item.iter_notes()
+
+    def __len__(self):
+        return self.n_notes
+
+    def __repr__(self):
+        return f"Sequence({list(self.items)!r})"
+
+
+class Repeat:
+    def __init__(self, body: Sequence, count: int):
+        """
+        Sequence that is played count times.
+
+        :param body: Repeated sequence
+        :param count: Number of times the body is played
+        """
+        self.body = body
+        self.count = count
+        self.n_notes = body.n_notes * count
+        self.ticks = body.ticks * count
+
+    @property
+    def dur(self) -> float:
+        """
+        Return total duration in beats.
+        """
+        return from_ticks(self.ticks)
+
+    def iter_notes(self) -> Iterator[Note]:
+        """
+        Yield all notes in order.
+        """
+        for _ in range(self.count):
+            yield from self.body.iter_notes()
+
+    def __len__(self):
+        return self.n_notes
+
+    def __repr__(self):
+        return f"Repeat({self.body!r}, count={self.count!r})"
+
+
 class Score:
-    def __init__(self, notes: Optional[List[Note]] = None):
+    # Cumulative onsets in ticks, built lazily and reset by mutations
+    _onsets: Optional[List[int]] = None
+    # Whether the notes list may be shared with another score
+    _shared: bool = False
+
+    def __init__(
+        self,
+        notes: Optional[List[Note]] = None,
+        intro: Optional[Sequence] = None,
+        loop: Optional[Sequence] = None,
+    ):
         """
         Class representing score.
 
+        A score can be created from a structured form instead of notes, consisting of
+        an intro and an optional part that loops forever. Its notes are then expanded
+        lazily to the intro followed by a single iteration of the loop.
+
+        Time lookups use an index of cumulative onsets that is built on first use.
+        Mutations through the methods of the score keep it up to date, mutating the
+        notes list directly requires calling invalidate.
+
+        Copies share their notes list until either score is modified through its
+        methods (copy-on-write).
+
         :param notes: Notes of score
+        :param intro: Structured intro
+        :param loop: Structured part looping forever after the intro
         """
-        if notes is None:
+        if notes is None and intro is None:
             notes = []
-        self.notes = notes
+        self._notes = notes
+        self.intro = intro
+        self.loop = loop
+
+    @property
+    def notes(self) -> List[Note]:
+        """
+        Return notes, expanding the structured form on first access.
+        """
+        if self._notes is None:
+            self._notes = list(self.iter_notes(loops=1))
+        return self._notes
+
+    @notes.setter
+    def notes(self, notes: List[Note]):
+        self._notes = notes
+        self._onsets = None
+        self._shared = False
+
+    def copy(self) -> "Score":
+        """
+        Return copy of score sharing the notes list until modified.
+        """
+        score = Score(self.notes)
+        score._onsets = self._onsets
+        score._shared = self._shared = True
+        return score
+
+    def _own_notes(self) -> List[Note]:
+        if self._shared:
+            self._notes = list(self.notes)
+            if self._onsets is not None:
+                self._onsets = list(self._onsets)
+            self._shared = False
+        return self.notes
+
+    @property
+    def onsets(self) -> List[int]:
+        """
+        Return onset of every note in ticks, followed by the total duration.
+        """
+        notes = self.notes
+        if self._onsets is None or len(self._onsets) != len(notes) + 1:
+            self._onsets = list(accumulate(chain((0,), (n.ticks for n in notes))))
+        return self._onsets
+
+    def invalidate(self) -> None:
+        """
+        Discard timeline index after notes have been modified directly.
+        """
+        self._onsets = None
+
+    @property
+    def is_structured(self) -> bool:
+        """
+        Return whether score has a structured form.
+        """
+        return self.intro is not None
+
+    def iter_notes(self, loops: int = 1) -> Iterator[Note]:
+        """
+        Lazily yield notes of intro followed by the requested number of loops.
+
+        :param loops: Number of loop iterations
+        """
+        if self.intro is None:
+            yield from self.notes
+            return
+        yield from self.intro.iter_notes()
+        if self.loop is not None:
+            for _ in range(loops):
+                yield from self.loop.iter_notes()
+
+    def expand(self, loops: int = 1) -> "Score":
+        """
+        Return flat score of intro followed by the requested number of loops.
+
+        :param loops: Number of loop iterations
+        """
+        return Score(list(self.iter_notes(loops=loops)))
+
+    def get_expanded_len(self, loops: int = 1) -> int:
+        """
+        Return number of notes of expanded score without expanding it.
+
+        :param loops: Number of loop iterations
+        """
+        if self.intro is None:
+            return len(self.notes)
+        return self.intro.n_notes + (self.loop.n_notes * loops if self.loop else 0)
+
+    def get_expanded_dur(self, loops: int = 1) -> float:
+        """
+        Return total duration of expanded score without expanding it.
+
+        :param loops: Number of loop iterations
+        """
+        if self.intro is None:
+            return self.get_total_dur()
+        return from_ticks(
+            self.intro.ticks + (self.loop.ticks * loops if self.loop else 0)
+        )
 
     def append(self, note: Note):
         """
@@ -156,7 +433,9 @@ class Score:
 
         :param note: Note to a append
         """
-        self.notes.append(note)
+        self._own_notes().append(note)
+        if self._onsets is not None:
+            self._onsets.append(self._onsets[-1] + note.ticks)
 
     def extend(self, notes: List[Note]):
         """
@@ -164,13 +443,18 @@ class Score:
 
         :param note: Notes to a append
         """
-        self.notes.extend(notes)
+        self._own_notes().extend(notes)
+        self._onsets = None
 
     def __getitem__(self, key: int):
         return self.notes.__getitem__(key)
 
     def __setitem__(self, key: int, value: Note):
-        return self.notes.__setitem__(key, value)
+        if self._onsets is not None and (
+            not isinstance(key, int) or self.notes[key].ticks != value.ticks
+        ):
+            self._onsets = None
+        return self._own_notes().__setitem__(key, value)
 
     def __iter__(self):
         return iter(self.notes)
@@ -178,22 +462,26 @@ class Score:
     def __len__(self):
         return self.notes.__len__()
 
+    def idx_at_ticks(self, ticks: int) -> Tuple[int, int]:
+        """
+        Return index and cumulative ticks of note playing at specified tick.
+
+        :param ticks: Ticks from beginning of score
+        """
+        onsets = self.onsets
+        idx = bisect_left(onsets, ticks)
+        if idx == len(onsets):
+            return None, None
+        return idx, onsets[idx]
+
     def idx_at_dur(self, dur: IntFloat) -> Tuple[int, float]:
         """
         Return index and cumulative duration of note playing at specified duration.
 
         :param dur: Duration from beginning of score
         """
-        current_dur = 0
-        current_idx = 0
-        while current_dur < dur:
-            if current_idx == len(self.notes):
-                break
-            current_dur = align_duration(current_dur + self.notes[current_idx].dur)
-            current_idx += 1
-        else:
-            return current_idx, current_dur
-        return None, None
+        idx, ticks = self.idx_at_ticks(to_ticks(dur))
+        return idx, from_ticks(ticks)
 
     def note_at_dur(self, dur: IntFloat) -> Note:
         """
@@ -206,11 +494,39 @@ class Score:
             return None
         return self.notes[idx]
 
+    def idx_range_at_ticks(self, ticks_from: int, ticks_to: int) -> range:
+        """
+        Return indices of notes sounding in the interval [ticks_from, ticks_to).
+
+        :param ticks_from: Start of interval in ticks
+        :param ticks_to: End of interval in ticks
+        """
+        onsets = self.onsets
+        start = max(0, bisect_right(onsets, ticks_from) - 1)
+        stop = min(len(onsets) - 1, bisect_left(onsets, ticks_to))
+        return range(start, max(start, stop))
+
+    def notes_between(self, dur_from: IntFloat, dur_to: IntFloat) -> List[Note]:
+        """
+        Return notes sounding in the interval [dur_from, dur_to).
+
+        :param dur_from: Start of interval from beginning of score
+        :param dur_to: End of interval from beginning of score
+        """
+        idxs = self.idx_range_at_ticks(to_ticks(dur_from), to_ticks(dur_to))
+        return self.notes[idxs.start : idxs.stop]
+
+    def get_total_ticks(self) -> int:
+        """
+        Return total duration of score in ticks.
+        """
+        return self.onsets[-1]
+
     def get_total_dur(self) -> float:
         """
         Return total duration of score.
         """
-        return align_duration(sum(s.dur for s in self))
+        return from_ticks(self.get_total_ticks())
 
     def __repr__(self):
         return (
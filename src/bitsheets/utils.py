@@ -1,7 +1,8 @@
 import logging
 import math
 import sys
-from typing import Any, List, Optional, Union
+from functools import reduce
+from typing import Any, Optional
 
 
 class SimpleFilter(logging.Filter):
@@ -88,49 +89,43 @@ def round_if_close(val: Any, ndigits: int = 0, eps: float = 1e-5) -> Any:
     return val
 
 
-def align_duration(dur: Optional[float], tuplets: List[int] = [3, 5]):
-    """
-    Align durations to grid.
+# Ticks per beat, the least common multiple of the denominators of all supported
+# durations: tenths, triplets, quintuplets and the 1.5x and 2x speed multipliers
+TICKS_PER_BEAT = reduce(lambda a, b: a * b // math.gcd(a, b), (10, 3, 5, 2))
 
-    We keep durations as float so this is a little hacky.
 
-    :param dur: The duration to align
-    :param tuplets: Tuplets to check
+def to_ticks(dur: Optional[float], eps: float = 1e-5) -> Optional[int]:
+    """
+    Convert duration in beats to integer ticks.
+
+    :param dur: The duration to convert
+    :param eps: Tolerance in beats
     """
     if dur is None:
         return None
 
-    if is_close_to_round(dur, ndigits=1):
-        return round(dur, 1)
-
-    for tuplet_base in tuplets:
-        for i in range(1, tuplet_base):
-            if math.isclose(dur % 1, i / tuplet_base):
-                return dur // 1 + i / tuplet_base
-
-    raise ValueError("Could not align duration to grid")
+    ticks = dur * TICKS_PER_BEAT
+    rounded = round(ticks)
+    if abs(ticks - rounded) >= eps * TICKS_PER_BEAT:
+        raise ValueError("Could not align duration to grid")
+    return rounded
 
 
-def parse_index(index: Union[int, str, List[Union[int, str]]], max_len: int):
+def from_ticks(ticks: Optional[int]) -> Optional[float]:
     """
-    Parse collection of integer/string index.
+    Convert integer ticks to duration in beats.
 
-    :param index: Index to parse
-    :param max_len: Length of score (for negative indices)
+    :param ticks: The ticks to convert
     """
-    if isinstance(index, int) or isinstance(index, str):
-        index = [index]
-
-    def try_parse_str(s: Union[int, str]):
-        if isinstance(s, int):
-            return [s]
-        fr, to = s.split(">")
-        fr, to = int(fr or 0), int(to or max_len)
-        return range(fr, to + 1)
+    if ticks is None:
+        return None
+    return ticks / TICKS_PER_BEAT
 
-    index = [xi for s in index for xi in try_parse_str(s)]
 
-    # Support negative indices
-    index = [i if i >= 0 else i + max_len for i in index]
+def align_duration(dur: Optional[float]) -> Optional[float]:
+    """
+    Align durations to grid.
 
-    return index
+    :param dur: The duration to align
+    """
+    return from_ticks(to_ticks(dur))
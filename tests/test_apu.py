@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from bitsheets.apu import (
+    APU_WAVEFORMS,
+    DEFAULT_WAVE_RAM,
+    NOISE_STEPS,
+    NOISE_WIDTHS,
+    PULSE_DUTIES,
+    TABLE_SIZE,
+    Wavetable,
+    get_lfsr_levels,
+    get_wavetable,
+)
+
+
+def get_hardware_lfsr_levels(width):
+    # Register as on the hardware: starts from 0, XNOR feedback, inverted output
+    lfsr = 0
+    levels = []
+    for _ in range(2**width - 1):
+        levels.append(-1 if lfsr & 1 else 1)
+        feedback = ~(lfsr ^ (lfsr >> 1)) & 1
+        lfsr = (lfsr >> 1) | (feedback << (width - 1))
+    return np.array(levels, dtype=np.float32)
+
+
+@pytest.mark.parametrize(
+    "waveform, duty",
+    [("pulse12", 1 / 8), ("pulse25", 2 / 8), ("pulse50", 4 / 8), ("pulse75", 6 / 8)],
+)
+def test_pulse_duty_cycles(waveform, duty):
+    assert len(PULSE_DUTIES[waveform]) == 8
+    assert np.mean(PULSE_DUTIES[waveform]) == duty
+
+
+@pytest.mark.parametrize("waveform", APU_WAVEFORMS)
+def test_wavetable_shape(waveform):
+    table = get_wavetable(waveform)
+
+    assert table.tables.dtype == np.float32
+    if waveform in NOISE_WIDTHS:
+        assert table.tables.shape == (1, 2 ** NOISE_WIDTHS[waveform] - 1)
+    else:
+        assert table.tables.shape == (int(np.log2(TABLE_SIZE)), TABLE_SIZE)
+        assert np.abs(table.tables).max() == pytest.approx(1)
+        # DC component is removed in every band
+        np.testing.assert_allclose(table.tables.mean(axis=1), 0, atol=1e-6)
+
+
+def test_band_limits():
+    table = get_wavetable("pulse50")
+    n_bands, size = table.tables.shape
+
+    # Band 0 keeps all harmonics up to the Nyquist frequency
+    for b in range(1, n_bands):
+        spectrum = np.abs(np.fft.rfft(table.tables[b]))
+        assert spectrum[(size // 2 >> b) + 1 :].max() < 1e-3
+    # Highest band holds the fundamental only
+    assert spectrum[1] > 1
+
+
+def test_wave_ram_mapping():
+    wave_ram = [0, 15, 3, 7] * 8
+    table = get_wavetable("wave", wave_ram)
+    full_band = table.tables[0]
+    samples_per_level = TABLE_SIZE // 32
+
+    # Every 4-bit sample spans an equal part of the cycle, offset by the mean
+    expected = np.repeat(np.array(wave_ram) - np.mean(wave_ram), samples_per_level)
+    scale = full_band[0] / expected[0]
+    assert scale > 0
+    np.testing.assert_allclose(full_band, scale * expected, atol=1e-5)
+
+
+def test_default_wave_ram():
+    assert len(DEFAULT_WAVE_RAM) == 32
+    assert get_wavetable("wave") is get_wavetable("wave", list(DEFAULT_WAVE_RAM))
+
+
+@pytest.mark.parametrize(
+    "wave_ram", [[0] * 31, [0] * 33, [16] + [0] * 31, [-1] + [0] * 31]
+)
+def test_invalid_wave_ram(wave_ram):
+    with pytest.raises(ValueError):
+        get_wavetable("wave", wave_ram)
+
+
+def test_invalid_waveform_and_cycle():
+    with pytest.raises(ValueError):
+        get_wavetable("triangle")
+    with pytest.raises(ValueError):
+        Wavetable.from_cycle((0, 1, 1), size=16)
+
+
+@pytest.mark.parametrize("width, period", [(7, 127), (15, 32767)])
+def test_lfsr_period(width, period):
+    levels = get_lfsr_levels(width)
+
+    assert len(levels) == period
+    np.testing.assert_array_equal(levels, get_hardware_lfsr_levels(width))
+    # Maximal length sequence: no shorter period, one more high than low level
+    for divisor in range(1, period):
+        if period % divisor == 0:
+            assert not np.array_equal(levels, np.roll(levels, divisor))
+    assert np.sum(levels == 1) == (period + 1) // 2
+    assert np.sum(levels == -1) == (period - 1) // 2
+
+
+@pytest.mark.parametrize("waveform, width", [("noise", 15), ("noise7", 7)])
+def test_noise_rate(waveform, width):
+    table = get_wavetable(waveform)
+
+    assert table.rate == NOISE_STEPS / (2**width - 1)
+    np.testing.assert_array_equal(table.tables[0], get_lfsr_levels(width))
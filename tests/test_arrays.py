@@ -0,0 +1,41 @@
+import pytest
+
+from bitsheets.arrays import CHORD, REST, ScoreArray
+from bitsheets.types import Note, Score
+
+
+def describe(notes):
+    return [(note.note, note.octave, note.ticks) for note in notes]
+
+
+def make_score():
+    return Score(
+        [
+            Note("c", 4, 1),
+            Note("r", None, 0.5),
+            Note(["e", "g"], [4, 4], 1),
+            Note("ais", 3, 1.5),
+            Note(["c", "e", "g"], [5, 5, 5], 2),
+            Note("r", None, 1),
+        ]
+    )
+
+
+def test_round_trip_with_chords_and_rests():
+    score = make_score()
+    array = ScoreArray.from_score(score)
+    assert array.pitch.tolist() == [60, REST, CHORD, 58, CHORD, REST]
+    assert array.chords == {2: (64, 67), 4: (72, 76, 79)}
+    assert describe(array.to_score()) == describe(score)
+    assert describe(array) == describe(score)
+    assert ScoreArray.from_score(array) is array
+
+
+@pytest.mark.parametrize(
+    "key", [slice(1, 5), slice(2, None), slice(None, None, 2), slice(None, 1, -2)]
+)
+def test_slicing_reindexes_chords(key):
+    score = make_score()
+    array = ScoreArray.from_score(score)[key]
+    assert describe(array) == describe(score.notes[key])
+    assert array.chords == ScoreArray.from_score(Score(score.notes[key])).chords
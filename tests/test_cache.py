@@ -0,0 +1,40 @@
+import os
+import time
+
+from bitsheets.cache import STALE_TMP_SECONDS, ScoreCache
+from bitsheets.types import Score
+
+
+def test_put_replacing_entry_keeps_size(tmp_path):
+    cache = ScoreCache(str(tmp_path))
+    cache.put("a", Score())
+    cache.put("a", Score())
+    size = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert cache.stats()["bytes"] == size
+
+
+def test_get_removes_unloadable_entries(tmp_path):
+    # Pickle of a class that no longer exists and a truncated pickle
+    (tmp_path / "stale.pkl").write_bytes(b"cbitsheets.gone\nScore\n.")
+    (tmp_path / "truncated.pkl").write_bytes(b"\x80")
+    cache = ScoreCache(str(tmp_path))
+
+    assert cache.get("stale") is None
+    assert cache.get("truncated") is None
+    assert cache.get("missing") is None
+    assert cache.stats()["misses"] == 3
+    assert os.listdir(tmp_path) == []
+    assert cache.stats()["bytes"] == 0
+
+
+def test_clear_removes_stale_tmp_files(tmp_path):
+    cache = ScoreCache(str(tmp_path))
+    stale = tmp_path / "stale.tmp"
+    fresh = tmp_path / "fresh.tmp"
+    stale.write_bytes(b"x")
+    fresh.write_bytes(b"x")
+    old = time.time() - STALE_TMP_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    cache.clear()
+    assert os.listdir(tmp_path) == ["fresh.tmp"]
@@ -0,0 +1,301 @@
+import io
+import wave
+
+import mido
+import numpy as np
+import pytest
+import yaml
+
+from bitsheets.apu import GB_WAVEFORMS
+from bitsheets.arrays import ScoreArray
+from bitsheets.output import (
+    WAV_HEADER_SIZE,
+    MidiWriter,
+    WavWriter,
+    _encode_vlq,
+    dump_scores_midi,
+    dump_scores_wav,
+    get_midi_note,
+    iter_dump_tracks_wav,
+)
+from bitsheets.parser import PokemonRBYParser
+from bitsheets.player import Mixer, Player
+from bitsheets.types import Note, Score
+from bitsheets.utils import TICKS_PER_BEAT
+
+FS = 8000
+START = 0x4000
+
+# Two channels: notes with a rest in octave 4, and notes in octave 3
+CODE = [0xE4, 0x01, 0xC0, 0x41, 0xFF, 0xE5, 0x20, 0x71, 0x50, 0xFF]
+
+
+def read_wav(pth):
+    with wave.open(str(pth), "rb") as f:
+        assert (f.getnchannels(), f.getsampwidth()) == (1, 2)
+        return f.getframerate(), np.frombuffer(f.readframes(f.getnframes()), "<i2")
+
+
+def make_scores():
+    return [
+        Score([Note("c", 4, 1), Note("r", None, 0.5), Note("e", 3, 1.5)]),
+        Score([Note("g", 2, 2), Note("a", 5, 0.5)]),
+    ]
+
+
+@pytest.fixture
+def rom_files(tmp_path):
+    rom_pth = tmp_path / "rom.gb"
+    rom_pth.write_bytes(bytes(START) + bytes(CODE))
+    ptrs_pth = tmp_path / "ptrs.yaml"
+    ptrs = {
+        "good": {"channels": [START, START + 5], "ptr_offset": 0},
+        "broken": {"channels": [START]},  # no ptr_offset
+    }
+    ptrs_pth.write_text(yaml.safe_dump(ptrs))
+    return str(rom_pth), str(ptrs_pth)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_wav_writer_blocks(tmp_path, use_mmap):
+    w = np.arange(-500, 500, dtype=np.int16) * 37
+    pth = tmp_path / "out.wav"
+
+    with WavWriter(str(pth), FS, len(w), use_mmap) as writer:
+        for start in range(0, len(w), 300):
+            writer.write(w[start : start + 300])
+
+    assert writer.n_written == len(w)
+    fs, read = read_wav(pth)
+    assert fs == FS
+    np.testing.assert_array_equal(read, w)
+
+
+def test_wav_writer_mmap_short_write_is_truncated(tmp_path):
+    pth = tmp_path / "out.wav"
+
+    with WavWriter(str(pth), FS, 100, use_mmap=True) as writer:
+        writer.write(np.ones(40, dtype=np.int16))
+
+    assert pth.stat().st_size == WAV_HEADER_SIZE + 2 * 40
+    np.testing.assert_array_equal(read_wav(pth)[1], np.ones(40))
+
+
+def test_wav_writer_mmap_errors(tmp_path):
+    pth = str(tmp_path / "out.wav")
+
+    with pytest.raises(ValueError):
+        WavWriter(pth, FS, use_mmap=True)
+    with WavWriter(pth, FS, 10, use_mmap=True) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros(11, dtype=np.int16))
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_wav_writer_empty(tmp_path, use_mmap):
+    pth = tmp_path / "out.wav"
+
+    with WavWriter(str(pth), FS, 0, use_mmap):
+        pass
+
+    assert pth.stat().st_size == WAV_HEADER_SIZE
+    assert len(read_wav(pth)[1]) == 0
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+@pytest.mark.parametrize("block_size", [1000, 2**16])
+def test_dump_scores_wav_equals_mixer(tmp_path, use_mmap, block_size):
+    player = Player(FS, waveform=GB_WAVEFORMS)
+    scores = make_scores()
+    pth = tmp_path / "out.wav"
+
+    n_samples = dump_scores_wav(
+        scores, str(pth), player, block_size=block_size, use_mmap=use_mmap
+    )
+
+    fs, read = read_wav(pth)
+    assert fs == FS
+    assert n_samples == len(read) == player.get_n_samples(scores)
+    np.testing.assert_array_equal(read, Mixer(player).get_wave(scores))
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_dump_scores_wav_empty(tmp_path, use_mmap):
+    pth = tmp_path / "out.wav"
+
+    assert dump_scores_wav([Score([])], str(pth), Player(FS), use_mmap=use_mmap) == 0
+    assert len(read_wav(pth)[1]) == 0
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_iter_dump_tracks_wav(tmp_path, rom_files, use_mmap):
+    rom_pth, ptrs_pth = rom_files
+    out_pth = tmp_path / "out"
+
+    results = {
+        result.track: result
+        for result in iter_dump_tracks_wav(
+            rom_pth,
+            ptrs_pth,
+            str(out_pth),
+            processes=1,
+            fs=FS,
+            waveform=GB_WAVEFORMS,
+            block_size=1000,
+            use_mmap=use_mmap,
+        )
+    }
+
+    assert sorted(results) == ["broken", "good"]
+    broken = results["broken"]
+    assert broken.pth is None and broken.n_samples == 0
+    assert "KeyError" in broken.error
+
+    good = results["good"]
+    assert good.error is None
+    assert good.pth == str(out_pth / "good.wav")
+    with open(rom_pth, "rb") as f:
+        scores = PokemonRBYParser(f.read()).get_scores(
+            {"channels": [START, START + 5], "ptr_offset": 0}
+        )
+    expected = Mixer(Player(FS, waveform=GB_WAVEFORMS)).get_wave(scores)
+    _, read = read_wav(good.pth)
+    assert good.n_samples == len(read) == len(expected) > 0
+    np.testing.assert_array_equal(read, expected)
+
+
+def test_iter_dump_tracks_wav_unknown_track(tmp_path, rom_files):
+    rom_pth, ptrs_pth = rom_files
+
+    (result,) = iter_dump_tracks_wav(
+        rom_pth, ptrs_pth, str(tmp_path), tracks=["missing"], processes=1, fs=FS
+    )
+
+    assert result.track == "missing" and result.pth is None
+    assert "KeyError: 'missing'" in result.error
+
+
+def get_reference_messages(score, dur_multiplier=128, velocity=64):
+    # Messages of the former mido writer, with the rest delta reset per track
+    # and chords starting and stopping all of their pitches at once
+    messages = []
+    delta = 0
+    for note in score:
+        duration = note.ticks * dur_multiplier // TICKS_PER_BEAT
+        if note.note == "r":
+            delta += duration
+            continue
+        if isinstance(note.note, str):
+            pitches = [get_midi_note(note.note, note.octave)]
+        else:
+            pitches = [get_midi_note(n, o) for n, o in zip(note.note, note.octave)]
+        for i, pitch in enumerate(pitches):
+            messages.append(
+                mido.Message(
+                    "note_on", note=pitch, velocity=velocity, time=0 if i else delta
+                )
+            )
+        for i, pitch in enumerate(pitches):
+            messages.append(
+                mido.Message(
+                    "note_off",
+                    note=pitch,
+                    velocity=velocity,
+                    time=0 if i else duration,
+                )
+            )
+        delta = 0
+    return messages, delta
+
+
+def read_midi(data):
+    return mido.MidiFile(file=io.BytesIO(data))
+
+
+@pytest.mark.parametrize(
+    "value, encoded",
+    [
+        (0, b"\x00"),
+        (0x7F, b"\x7f"),
+        (0x80, b"\x81\x00"),
+        (0x2000, b"\xc0\x00"),
+        (0x3FFF, b"\xff\x7f"),
+        (0x4000, b"\x81\x80\x00"),
+        (0x1FFFFF, b"\xff\xff\x7f"),
+        (0x200000, b"\x81\x80\x80\x00"),
+        (0x0FFFFFFF, b"\xff\xff\xff\x7f"),
+    ],
+)
+def test_encode_vlq(value, encoded):
+    assert _encode_vlq(value) == encoded
+
+
+@pytest.mark.parametrize("value", [-1, 2**28])
+def test_encode_vlq_out_of_range(value):
+    with pytest.raises(ValueError):
+        _encode_vlq(value)
+
+
+def test_midi_matches_reference_messages(tmp_path):
+    scores = [
+        Score(
+            [
+                Note("r", None, 1),
+                Note("c", 4, 1),
+                Note(["g", "c", "e"], [4, 4, 4], 2),
+                Note("r", None, 0.5),
+                Note("r", None, 0.5),
+                Note("a", 2, 1.5),
+                Note("r", None, 1),
+            ]
+        ),
+        Score([Note("e", 3, 0.5), Note("r", None, 1), Note(["c", "g"], [5, 5], 1)]),
+        Score([Note("r", None, 2)]),
+    ]
+    pth = tmp_path / "out.mid"
+
+    dump_scores_midi(scores, str(pth), tempo=400000)
+
+    midi = mido.MidiFile(str(pth))
+    assert midi.type == 1 and midi.ticks_per_beat == 480
+    assert len(midi.tracks) == len(scores) + 1
+    assert list(midi.tracks[0]) == [
+        mido.MetaMessage("set_tempo", tempo=400000, time=0),
+        mido.MetaMessage("end_of_track", time=0),
+    ]
+    for score, track in zip(scores, midi.tracks[1:]):
+        messages, trailing = get_reference_messages(score)
+        assert list(track[:-1]) == messages
+        # Trailing rests keep the length of the track
+        assert track[-1] == mido.MetaMessage("end_of_track", time=trailing)
+        assert sum(msg.time for msg in track) == sum(
+            note.ticks * 128 // TICKS_PER_BEAT for note in score
+        )
+
+
+def test_midi_rest_delta_does_not_leak_into_next_track():
+    scores = [
+        Score([Note("c", 4, 1), Note("r", None, 2)]),
+        Score([Note("d", 4, 1)]),
+    ]
+
+    midi = read_midi(MidiWriter().to_bytes(scores))
+
+    first, second = midi.tracks[1:]
+    assert first[-1].time == 256
+    assert second[0].type == "note_on" and second[0].time == 0
+
+
+def test_midi_writer_reuse_and_score_arrays():
+    scores = [
+        Score([Note("c", 4, 1), Note("r", None, 0.5), Note(["c", "e"], [4, 4], 1)]),
+        Score([Note("f", 2, 1.5)]),
+    ]
+    writer = MidiWriter()
+
+    data = writer.to_bytes(scores)
+
+    # Cached events give the same bytes, also for score arrays
+    assert writer.to_bytes(scores) == data
+    assert writer.to_bytes([ScoreArray.from_score(s) for s in scores]) == data
+    assert MidiWriter().to_bytes(scores) == data
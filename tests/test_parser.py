@@ -0,0 +1,153 @@
+import pytest
+
+from bitsheets.cache import ScoreCache
+from bitsheets.parser import ParserTrace, PokemonRBYParser
+from bitsheets.types import Repeat
+
+START = 0x4000
+
+
+def make_rom(code):
+    rom = bytearray(START)
+    rom += bytes(code)
+    return bytes(rom)
+
+
+def describe(notes):
+    return [(note.note, note.octave, note.ticks) for note in notes]
+
+
+def test_shared_block_is_decoded_once():
+    sub = START + 0x20
+    # Two channels call the same subroutine in different octaves
+    code = [0xE4, 0xFD, 0x20, 0x40, 0xFF, 0xE3, 0xFD, 0x20, 0x40, 0xFF]
+    code += [0x00] * (0x20 - len(code)) + [0x01, 0x41, 0xFF]
+    parser = PokemonRBYParser(make_rom(code))
+
+    first = parser.parse_from_pointer(START, 0)
+    block = parser.get_block(sub)
+    second = parser.parse_from_pointer(START + 5, 0)
+    assert parser.get_block(sub) is block
+    assert sorted(parser._blocks) == [START, START + 4, START + 5, START + 9, sub]
+    assert describe(first) == [("c", 4, 60), ("e", 4, 60)]
+    assert describe(second) == [("c", 5, 60), ("e", 5, 60)]
+    # Resolved notes are memoized per block and entry state
+    assert parser._resolve_block(block, 4, 1) is parser._resolve_block(block, 4, 1)
+    assert parser._resolve_block(block, 5, 1) is not parser._resolve_block(block, 4, 1)
+
+
+def test_call_returns_after_call_site():
+    # Octave set in the subroutine carries over to the caller
+    code = [0xE4, 0x20, 0xFD, 0x08, 0x40, 0x41, 0xFF, 0x00, 0xE3, 0x50, 0xFF]
+    parser = PokemonRBYParser(make_rom(code))
+
+    block = parser.get_block(START)
+    assert block.exit.desc == "Call" and block.target == START + 8
+    assert block.exit_ptr == START + 3
+    assert describe(parser.parse_from_pointer(START, 0)) == [
+        ("d", 4, 30),
+        ("f", 5, 30),
+        ("e", 5, 60),
+    ]
+
+
+def test_loop_back_edge_plays_body_twice():
+    code = [0xE4, 0x00, 0x21, 0xFE, 0x02, 0x01, 0x40, 0x42, 0xFF]
+    parser = PokemonRBYParser(make_rom(code))
+
+    notes = parser.parse_from_pointer(START, 0)
+    assert describe(notes) == [
+        ("c", 4, 30),
+        ("d", 4, 60),
+        ("c", 4, 30),
+        ("d", 4, 60),
+        ("e", 4, 90),
+    ]
+    # The loop jumps back into the middle of the first block, which is decoded as
+    # a block of its own
+    assert parser.get_block(START).target == START + 1
+    assert parser.get_block(START + 1).ops == parser.get_block(START).ops[1:]
+    assert sorted(parser._blocks) == [START, START + 1, START + 7]
+
+
+def test_structured_loop_changing_octave_and_speed():
+    code = [0xDC, 0x10, 0xE4]
+    body = [0x02, 0xE3, 0xD8, 0x10, 0x21]
+    code += body + [0xFE, 0x02, 0x03, 0x40, 0x41, 0xFF]
+    parser = PokemonRBYParser(make_rom(code))
+
+    flat = list(parser.parse_from_pointer(START, 0))
+    structured = parser.parse_from_pointer(START, 0, structured=True)
+    assert list(structured.iter_notes()) == flat
+    assert structured.get_expanded_len() == len(flat)
+    # Second pass plays in the octave and speed set by the first pass
+    assert flat[0].octave == 4 and flat[2].octave == 5
+    assert flat[2].ticks != flat[0].ticks
+
+
+def test_structured_loop_keeping_state_is_repeat():
+    code = [0xDC, 0x10, 0xE4]
+    body = [0x02, 0xE3, 0x21, 0xE4]
+    code += body + [0xFE, 0x02, 0x03, 0x40, 0x41, 0xFF]
+    parser = PokemonRBYParser(make_rom(code))
+
+    flat = list(parser.parse_from_pointer(START, 0))
+    structured = parser.parse_from_pointer(START, 0, structured=True)
+    assert list(structured.iter_notes()) == flat
+    assert any(isinstance(item, Repeat) for item in structured.intro.items)
+
+
+def test_trace_records_skipped_and_unknown_opcodes():
+    code = [0xE4, 0xEC, 0x05, 0x11, 0xD3, 0xEB, 0x01, 0x02, 0x03, 0x22, 0xFF]
+    trace = ParserTrace()
+    parser = PokemonRBYParser(make_rom(code), trace=trace)
+    parser.parse_from_pointer(START, 0)
+
+    assert [r.byte for r in trace.records()] == [
+        0xE4,
+        0xEC,
+        0x11,
+        0xD3,
+        0xEB,
+        0x22,
+        0xFF,
+    ]
+    assert trace.summary()["opcodes"]["Unknown"] == 1
+    assert parser.get_block(START).skipped == (
+        (START + 1, b"\xec\x05"),
+        (START + 4, b"\xd3"),
+        (START + 5, b"\xeb\x01\x02\x03"),
+    )
+
+
+def test_trace_closes_failing_and_cached_channels(tmp_path):
+    # Note before any octave raises while decoding
+    code = [0x00, 0xFF, 0xE4, 0x00, 0x21, 0xFF]
+    trace = ParserTrace()
+    cache = ScoreCache(str(tmp_path))
+    parser = PokemonRBYParser(make_rom(code), cache=cache, trace=trace)
+
+    with pytest.raises(ValueError):
+        parser.parse_from_pointer(START, 0)
+    events = parser.iter_events(START + 2, 0)
+    next(events)
+    events.close()
+    stats = trace.summary()["channels"]
+    assert not stats["0x0+0x4000"]["complete"]
+    assert not stats["0x0+0x4002"]["complete"]
+    assert stats["0x0+0x4002"]["notes"] == 0
+
+    parser.parse_from_pointer(START + 2, 0)
+    n_records = trace.n_records
+    parser.parse_from_pointer(START + 2, 0)
+    assert trace.n_records == n_records
+    assert trace.summary()["cache_hits"] == 1
+    assert trace.channels[(0, START + 2)] == {
+        "bytes": 0,
+        "blocks": 0,
+        "jumps": 0,
+        "notes": 2,
+        "seconds": trace.channels[(0, START + 2)]["seconds"],
+        "complete": True,
+        "cached": True,
+    }
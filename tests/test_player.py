@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from bitsheets.apu import GB_WAVEFORMS
+from bitsheets.cache import NoteCache
+from bitsheets.player import Mixer, Player
+from bitsheets.types import Note, Score, Sequence
+
+FS = 8000
+
+
+def make_structured_score():
+    return Score(
+        intro=Sequence([Note("c", 4, 1), Note("r", None, 0.5), Note("e", 4, 1.5)]),
+        loop=Sequence([Note("g", 3, 0.5), Note("b", 5, 1), Note("r", None, 1)]),
+    )
+
+
+def make_scores():
+    return [
+        make_structured_score(),
+        Score([Note("a", 2, 2), Note("r", None, 1), Note("d", 3, 1.5)]),
+        Score([Note("f", 4, 0.5), Note("c", 5, 0.5)]),
+    ]
+
+
+def make_players():
+    return [
+        Player(FS),
+        Player(FS, waveform=GB_WAVEFORMS),
+        Player(FS, waveform=GB_WAVEFORMS, note_cache=NoteCache()),
+    ]
+
+
+@pytest.mark.parametrize("player", make_players())
+@pytest.mark.parametrize("block_size", [1, 7, 1000, 4096, 2**20])
+@pytest.mark.parametrize("loops", [1, 2])
+def test_iter_blocks_equals_render(player, block_size, loops):
+    score = make_structured_score()
+    expected = player.render(Score(list(score.iter_notes(loops=loops))))
+
+    blocks = list(player.iter_blocks([score], block_size=block_size, loops=loops))
+
+    assert all(len(block) == block_size for block in blocks[:-1])
+    assert 0 < len(blocks[-1]) <= block_size
+    np.testing.assert_array_equal(np.concatenate(blocks), expected)
+
+
+@pytest.mark.parametrize("player", make_players())
+@pytest.mark.parametrize("block_size", [7, 1000, 2**20])
+def test_mixer_iter_blocks_equals_mix(player, block_size):
+    mixer = Mixer(player, gains=[1.0, 0.5, 2.0], headroom=0.1)
+    scores = make_scores()
+    expected = mixer.mix(scores)
+
+    blocks = list(mixer.iter_blocks(scores, block_size=block_size))
+
+    w = np.concatenate(blocks)
+    assert len(w) == len(expected) == player.get_n_samples(scores)
+    # Channels are summed in a different order by the rendering threads
+    np.testing.assert_allclose(w, expected, rtol=0, atol=1e-3)
+
+
+def test_iter_blocks_empty_scores():
+    player = Player(FS)
+
+    assert list(player.iter_blocks([Score([])])) == []
+    assert list(player.iter_blocks([])) == []
+
+
+def test_iter_blocks_rejects_invalid_arguments():
+    player = Player(FS)
+
+    with pytest.raises(ValueError):
+        list(player.iter_blocks([Score([])], block_size=0))
+    with pytest.raises(ValueError):
+        list(player.iter_blocks([Score([]), Score([])], gains=[1.0]))
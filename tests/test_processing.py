@@ -0,0 +1,167 @@
+import pytest
+
+from bitsheets.processing import (
+    OPS,
+    OpSpec,
+    apply_processing,
+    compile_processing,
+)
+from bitsheets.types import Note, Score
+
+
+def describe(notes):
+    return [(note.note, note.octave, note.ticks) for note in notes]
+
+
+def make_score():
+    return Score(
+        [
+            Note("c", 4, 1),
+            Note("r", None, 0.5),
+            Note("r", None, 0.5),
+            Note("e", 3, 1),
+            Note("g", 5, 2),
+            Note("b", 2, 1),
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    "config, message",
+    [
+        ({"processing": {0: [["transpose", {"offset": 1}]]}}, "Unknown processing op"),
+        (
+            {"processing": {0: [["transpose_score_octave", {"offs": 1}]]}},
+            "Invalid arguments",
+        ),
+        ({"processing": {0: ["transpose_note"]}}, "Invalid arguments"),
+        ({"chords": {"channels": [0, 1], "type": "merge"}}, "Unknown chords type"),
+    ],
+)
+def test_compile_rejects_invalid_config(config, message):
+    with pytest.raises(ValueError, match=message):
+        compile_processing(config)
+
+
+def test_compile_rejects_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown processing backend"):
+        compile_processing({}, backend="fortran")
+
+
+def test_compile_fuses_steps_and_drops_identities():
+    plan = compile_processing(
+        {
+            "processing": {
+                0: [
+                    ["transpose_score_octave", {"offset": 1}],
+                    ["transpose_score_octave", {"offset": 2}],
+                    ["remove_note", {"index": 0}],
+                    ["transpose_score_octave", {"offset": 1}],
+                ],
+                1: [
+                    ["transpose_score_octave", {"offset": 1}],
+                    ["transpose_score_octave", {"offset": -1}],
+                    "combine_rests",
+                ],
+                2: [["transpose_score_octave", {"offset": 0}]],
+            }
+        }
+    )
+    assert [(step.name, step.args.get("offset")) for step in plan.steps[0]] == [
+        ("transpose_score_octave", 3),
+        ("remove_note", None),
+        ("transpose_score_octave", 1),
+    ]
+    assert [step.name for step in plan.steps[1]] == ["combine_rests"]
+    assert plan.steps[2] == []
+
+    scores = plan.run([make_score()] * 3)
+    assert describe(scores[1]) == describe(OPS["combine_rests"].fun(make_score()))
+    assert describe(scores[2]) == describe(make_score())
+
+
+def test_run_checks_declared_properties(monkeypatch):
+    config = {
+        "processing": {
+            0: [
+                ["transpose_note", {"offset": 1, "index": [0, -1]}],
+                ["split_notes", {"index": [1, 2]}],
+                "combine_rests",
+                ["eat_rests", {"max_dur": 1}],
+            ]
+        },
+        "chords": {"channels": [0, 1], "type": "align_shortest"},
+    }
+    scores = apply_processing([make_score()], config, check=True)
+    assert len(scores) == 3
+
+    # Op claiming to keep the number of notes while dropping the last one
+    monkeypatch.setitem(
+        OPS, "drop_last", OpSpec(lambda score: Score(score.notes[:-1]), True, True)
+    )
+    config = {"processing": {0: ["drop_last"]}}
+    assert len(apply_processing([make_score()], config)[0]) == 5
+    with pytest.raises(ValueError, match="changed number of notes"):
+        apply_processing([make_score()], config, check=True)
+
+
+def make_chord_score():
+    return Score(
+        [
+            Note("r", None, 1),
+            Note("c", 4, 1),
+            Note(["e", "g"], [4, 4], 2),
+            Note("r", None, 0.5),
+            Note("r", None, 0.5),
+            Note("a", 2, 1.5),
+            Note(["c", "e"], [5, 5], 0.5),
+            Note("r", None, 1),
+            Note("f", 6, 3),
+            Note("b", 3, 1),
+        ]
+    )
+
+
+def make_melody():
+    return Score([Note(n, o, 1) for n, o in zip("cdefgab", [1, 2, 3, 4, 5, 6, 7])])
+
+
+ARRAY_OP_CASES = [
+    ("transpose_score_octave", {"offset": -2}, make_chord_score),
+    ("transpose_note_octave", {"offset": 1, "index": [1, 2, -1]}, make_chord_score),
+    ("transpose_note_octave", {"offset": -1, "index": "1>3:2"}, make_chord_score),
+    ("transpose_note", {"offset": 5, "index": [1, 2, 6]}, make_chord_score),
+    ("transpose_note", {"offset": -7, "index": "-2>"}, make_chord_score),
+    # Both backends must reject semitone offsets of rests
+    ("transpose_note", {"offset": 1, "index": 0}, make_chord_score),
+    ("remove_note", {"index": "beats 2-5"}, make_chord_score),
+    ("remove_note", {"index": [-1, -2, 2]}, make_chord_score),
+    ("combine_rests", {}, make_chord_score),
+    ("transpose_score_below", {"t_note": "f", "t_octave": 4}, make_melody),
+    ("transpose_score_below", {"t_note": "c", "t_octave": 1}, make_melody),
+    # Both backends must reject comparing rests and chords with the threshold
+    ("transpose_score_below", {"t_note": "c", "t_octave": 3}, make_chord_score),
+    ("split_notes", {"index": [1, 2, 5]}, make_chord_score),
+    ("split_notes", {"index": [">:3", "beat 4"]}, make_chord_score),
+]
+
+
+@pytest.mark.parametrize("name, args, make", ARRAY_OP_CASES)
+def test_array_ops_match_python_ops(name, args, make):
+    assert OPS[name].array_fun is not None
+    config = {"processing": {0: [[name, args]]}}
+
+    results = {}
+    for backend in ("python", "numpy"):
+        try:
+            scores = apply_processing([make()], config, backend=backend, check=True)
+        except Exception as e:
+            results[backend] = type(e)
+        else:
+            results[backend] = [describe(score) for score in scores]
+    assert results["numpy"] == results["python"]
+
+
+def test_array_op_cases_cover_all_array_ops():
+    names = {name for name, spec in OPS.items() if spec.array_fun is not None}
+    assert names == {name for name, _, _ in ARRAY_OP_CASES}
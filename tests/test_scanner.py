@@ -0,0 +1,73 @@
+import yaml
+
+from bitsheets.scanner import (
+    MusicHeader,
+    dump_pointer_config,
+    find_music_headers,
+    scan_pointer_config,
+)
+
+CHANNEL = [0xE4, 0x00, 0xFF]
+
+
+def make_header(ptrs, first_id=0):
+    header = []
+    for c, ptr in enumerate(ptrs):
+        header += [c + first_id if c else (len(ptrs) - 1) << 6, ptr & 0xFF, ptr >> 8]
+    return header
+
+
+def make_rom(headers, channels):
+    rom = bytearray(0xC000)
+    for addr, header in headers.items():
+        rom[addr : addr + len(header)] = header
+    for addr in channels:
+        rom[addr : addr + len(CHANNEL)] = CHANNEL
+    return bytes(rom)
+
+
+def test_find_music_headers():
+    rom = make_rom(
+        {
+            0x0100: make_header([0x4100, 0x4110]),  # home bank
+            0x4000: make_header([0x4100, 0x4110, 0x4120]),
+            0x4010: make_header([0x4100, 0x4110], first_id=4),  # sound effect
+            0x4020: make_header([0x4100, 0x8110]),  # pointer out of bank
+            0x8000: make_header([0x4100, 0x4110, 0x4120, 0x4130]),
+        },
+        [],
+    )
+    assert find_music_headers(rom) == [
+        MusicHeader(0x4000, 0, [0x4100, 0x4110, 0x4120]),
+        MusicHeader(0x8000, 0x4000, [0x4100, 0x4110, 0x4120], 0x4130),
+    ]
+
+
+def test_scan_matches_names_on_all_channels(tmp_path):
+    rom = make_rom(
+        {
+            0x4000: make_header([0x4100, 0x4110, 0x4120]),
+            0x4010: make_header([0x4100, 0x4130, 0x4140]),
+            0x4020: make_header([0x4150, 0x4160, 0x4170]),
+        },
+        range(0x4100, 0x4180, 0x10),
+    )
+    known = {
+        "second": {"title": 'Say "hi": #2', "channels": [0x4100, 0x4130, 0x4140]},
+        "first": {"title": "Pokémon", "channels": [0x4100, 0x4110, 0x4120]},
+        # Configs may omit channels
+        "third": {"channels": [0x4160, 0x4170]},
+    }
+    for desc in known.values():
+        desc["ptr_offset"] = 0
+
+    config = scan_pointer_config(rom, known)
+    assert list(config) == ["first", "second", "third"]
+    assert config["second"]["channels"] == [0x4100, 0x4130, 0x4140]
+    assert config["third"]["channels"] == [0x4150, 0x4160, 0x4170]
+
+    pth = tmp_path / "ptrs.yaml"
+    dump_pointer_config(config, str(pth))
+    assert "- 0x4130" in pth.read_text()
+    with open(pth) as f:
+        assert yaml.safe_load(f) == config
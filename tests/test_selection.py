@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from bitsheets.selection import Selector, select
+from bitsheets.types import Note, Score
+
+N = 10
+
+
+def parse_index_baseline(index, max_len):
+    # parse_index as used by processing ops before selectors
+    if isinstance(index, int) or isinstance(index, str):
+        index = [index]
+
+    def try_parse_str(s):
+        if isinstance(s, int):
+            return [s]
+        fr, to = s.split(">")
+        fr, to = int(fr or 0), int(to or max_len)
+        return range(fr, to + 1)
+
+    index = [xi for s in index for xi in try_parse_str(s)]
+    return [i if i >= 0 else i + max_len for i in index]
+
+
+def make_score(n=N):
+    return Score([Note("c", 4, 2) for _ in range(n)])
+
+
+def indices(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+@pytest.mark.parametrize(
+    "index",
+    [
+        3,
+        -1,
+        12,
+        -12,
+        [0, 2, -2],
+        "2>5",
+        ">3",
+        "7>",
+        "-3>-1",
+        "-4>-2",
+        "5>2",
+        ["1>2", -1, "4>5"],
+    ],
+)
+def test_select_matches_baseline(index):
+    baseline = parse_index_baseline(index, N)
+    expected = [i for i in range(N) if i in baseline]
+    assert indices(select(make_score(), index)) == expected
+
+
+@pytest.mark.parametrize(
+    "index, baseline, expected",
+    [
+        # Ends are made positive before building the range, so mixed-sign ranges
+        # no longer wrap around the end of the score
+        ("-3>", list(range(N)), [7, 8, 9]),
+        ("-2>1", [0, 1, 8, 9], []),
+        ("2>-3", [], [2, 3, 4, 5, 6, 7]),
+    ],
+)
+def test_select_mixed_sign_ranges(index, baseline, expected):
+    assert [i for i in range(N) if i in parse_index_baseline(index, N)] == baseline
+    assert indices(select(make_score(), index)) == expected
+
+
+@pytest.mark.parametrize(
+    "index, expected",
+    [
+        ("0>:3", [0, 3, 6, 9]),
+        ("1>6:2", [1, 3, 5]),
+        (">:4", [0, 4, 8]),
+        ("-12>:3", [1, 4, 7]),
+        ("-5>:2", [5, 7, 9]),
+        ("bar 1", [0, 1]),
+        ("bars 2-3", [2, 3, 4, 5]),
+        ("beat 4", [2]),
+        ("beats 3-7", [2, 3]),
+        (["bar 5", 0], [0, 8, 9]),
+    ],
+)
+def test_select_stepped_and_time_ranges(index, expected):
+    selector = Selector(index, bar_length=4)
+    assert indices(selector.select(make_score())) == expected
+    assert indices(selector.get_mask(N, np.arange(N) * 60)) == expected
+
+
+def test_select_bars_after_anacrusis():
+    selector = Selector("bar 1", bar_length=4, anacrusis=2)
+    assert indices(selector.select(make_score())) == [1, 2]
+
+
+@pytest.mark.parametrize("index", ["1>2:0", "bars 0", "beats 4-2", "a", 1.5])
+def test_selector_rejects_invalid_specs(index):
+    with pytest.raises(ValueError):
+        Selector(index)
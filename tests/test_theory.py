@@ -0,0 +1,80 @@
+import pytest
+
+from bitsheets.lilypond import dump_scores_lilypond
+from bitsheets.theory import KEYS, KeySection, get_key_sections, get_most_likely_key
+from bitsheets.types import Note, Score
+
+
+def make_score(pitches):
+    # Tonic, third and fifth are held longer than the other scale degrees
+    durs = [4, 1, 2, 1, 4, 1, 1, 2]
+    return Score([Note(n, o, d) for (n, o), d in zip(pitches, durs)])
+
+
+C_MAJOR = [("c", 4), ("d", 4), ("e", 4), ("f", 4), ("g", 4), ("a", 4), ("b", 4)]
+C_MAJOR += [("c", 5)]
+A_MINOR = [("a", 3), ("b", 3), ("c", 4), ("d", 4), ("e", 4), ("f", 4), ("gis", 4)]
+A_MINOR += [("a", 4)]
+EES_MAJOR = [("dis", 4), ("f", 4), ("g", 4), ("gis", 4), ("ais", 4), ("c", 5)]
+EES_MAJOR += [("d", 5), ("dis", 5)]
+FIS_MAJOR = [("fis", 4), ("gis", 4), ("ais", 4), ("b", 4), ("cis", 5), ("dis", 5)]
+FIS_MAJOR += [("f", 5), ("fis", 5)]
+
+
+@pytest.mark.parametrize(
+    "pitches, key",
+    [
+        (C_MAJOR, ("c", "major")),
+        (A_MINOR, ("a", "minor")),
+        (EES_MAJOR, ("ees", "major")),
+        (FIS_MAJOR, ("fis", "major")),
+    ],
+)
+def test_profile_method(pitches, key):
+    assert get_most_likely_key([make_score(pitches)], method="profile") == key
+
+
+def test_scale_method_is_default():
+    for pitches in (C_MAJOR, A_MINOR, EES_MAJOR):
+        scores = [make_score(pitches)]
+        assert get_most_likely_key(scores) == get_most_likely_key(scores, "scale")
+    # Scale method does not tell relative keys apart and keeps sharp spellings
+    assert get_most_likely_key([make_score(A_MINOR)]) == ("c", "major")
+    assert get_most_likely_key([make_score(EES_MAJOR)]) == ("dis", "major")
+    with pytest.raises(ValueError):
+        get_most_likely_key([make_score(C_MAJOR)], method="chords")
+
+
+def test_sheets_config_selects_key_method(tmp_path):
+    config = {"grouping": [{"channels": [0], "clef": "treble"}]}
+    pth = str(tmp_path / "sheet.ly")
+    scores = [make_score(A_MINOR)]
+
+    dump_scores_lilypond(scores, pth, config)
+    assert "\\key c \\major" in open(pth).read()
+    dump_scores_lilypond(scores, pth, {**config, "key_method": "profile"})
+    assert "\\key a \\minor" in open(pth).read()
+
+
+def test_key_sections():
+    score = Score(make_score(C_MAJOR).notes * 4 + make_score(FIS_MAJOR).notes * 4)
+    sections = get_key_sections([score], window=16)
+    assert [(s.start, s.key) for s in sections] == [
+        (0, ("c", "major")),
+        (64, ("fis", "major")),
+    ]
+    assert all(s.correlation > 0.9 for s in sections)
+
+    # Windows are aligned to bars after the anacrusis
+    sections = get_key_sections([score], window=16, anacrusis=8)
+    assert [s.start for s in sections] == [0, 56, 72]
+
+
+def test_key_sections_keep_key_within_margin():
+    score = Score(make_score(C_MAJOR).notes * 2 + make_score(A_MINOR).notes * 2)
+    assert len(get_key_sections([score], window=16, margin=0.1)) == 2
+    assert len(get_key_sections([score], window=16, margin=1)) == 1
+
+
+def test_key_sections_of_empty_score():
+    assert get_key_sections([Score()]) == [KeySection(0.0, KEYS[0], 0.0)]
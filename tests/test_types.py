@@ -0,0 +1,42 @@
+import copy
+import pickle
+
+import pytest
+
+from bitsheets.types import Note
+
+
+def test_single_notes_are_interned():
+    note = Note("c", 4, 1)
+    assert Note("c", 4, 1) is note
+    assert Note._from_trusted("c", 4, note.ticks) is note
+    assert note.from_dur(1) is note
+    assert copy.copy(note) is note and copy.deepcopy(note) is note
+    assert pickle.loads(pickle.dumps(note)) is note
+    assert Note("c", 4, 2) is not note
+    assert Note(["c"], [4], 1) is not note
+
+
+def test_notes_are_immutable():
+    note = Note("c", 4, 1)
+    with pytest.raises(AttributeError):
+        note.octave = 5
+    with pytest.raises(AttributeError):
+        del note.note
+    assert note.octave == 4
+
+
+def test_from_trusted_skips_normalization():
+    chord = Note._from_trusted(["e", "c"], [4, 4], 30)
+    assert chord.note == ["e", "c"]
+    assert chord.dur == 1
+    rest = Note._from_trusted("r", None, 15)
+    assert rest.dur == 0.5 and rest is Note("r", None, 0.5)
+
+
+def test_chords_are_ordered_by_pitch():
+    chord = Note(["dis", "ais", "r", "c", "dis"], [4, 3, None, 5, 4], 1)
+    assert chord.note == ["ais", "dis", "c"]
+    assert chord.octave == [3, 4, 5]
+    assert Note(["c", "r"], [4, None], 1).note == ["c"]
+    assert Note(["r"], [None], 1).note == "r"